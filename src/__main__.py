@@ -0,0 +1,11 @@
+# src/__main__.py
+import sys
+from pathlib import Path
+
+# Scripts import their siblings as top-level modules (from config import ...)
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from cli import main  # noqa: E402
+
+if __name__ == "__main__":
+    sys.exit(main())
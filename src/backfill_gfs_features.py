@@ -0,0 +1,224 @@
+# src/backfill_gfs_features.py
+"""
+Historical GFS feature backfill: runs get -> anomalies -> features for every
+(init, lead) in a date range so models can be trained on the same forecast
+features they are scored on (and per lead).
+
+    python src/backfill_gfs_features.py --start 2021-01-01 --end 2024-12-31 \
+        --cycles 0 12 --fxx_range 24 120 24 --workers 4
+
+Cycles are processed on a bounded thread pool (--workers cycles in flight,
+each downloading --lead_workers leads at once). Finished rows are buffered
+and flushed every --flush_every cycles into a new Parquet part under
+<out_dir>/year=YYYY/, and only then marked done in the manifest, so a killed
+run resumes where it stopped: done leads are skipped, failed cycles retried,
+and parts not referenced by the manifest (from an interrupted flush) are
+deleted on start. Read the result with
+storage.read_table(out_dir, "gfs_backfill"), keyed by (init_time, lead_h),
+plus region with --regions.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import pandas as pd
+import xarray as xr
+
+import build_forecast_climatology
+import compute_forecast_anomalies
+import extract_forecast_features
+import get_gfs_forecast
+from download_era5_hourly_region_monthly import Manifest
+from regions import domain_box, resolve_regions
+from storage import write_table
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Backfill GFS forecast features over historical cycles.")
+    p.add_argument("--start", type=str, required=True, help="First init date (UTC), e.g. 2021-01-01.")
+    p.add_argument("--end", type=str, required=True, help="Last init date (UTC), inclusive.")
+    p.add_argument("--cycles", type=int, nargs="+", default=[0, 6, 12, 18], help="Init hours to include.")
+    p.add_argument("--fxx_range", type=int, nargs=3, metavar=("START", "END", "STEP"), default=[24, 120, 24])
+    p.add_argument("--product", type=str, default="pgrb2.0p25")
+    p.add_argument("--south", type=float, default=25.0)
+    p.add_argument("--north", type=float, default=37.0)
+    p.add_argument("--west", type=float, default=-107.0)
+    p.add_argument("--east", type=float, default=-93.0)
+    p.add_argument("--regions", type=str, nargs="+", default=None,
+                   help="Features per region over one domain covering them (names, 'all' or a .json).")
+
+    p.add_argument("--clim_nc", type=str, default="data/processed/climatology_doy.nc")
+    p.add_argument("--clim_store", type=str, default=build_forecast_climatology.DEFAULT_STORE)
+    p.add_argument("--out_dir", type=str, default="data/processed/gfs_backfill")
+    p.add_argument("--manifest", type=str, default=None,
+                   help="Checkpoint JSON. Default: <out_dir>_manifest.json")
+
+    p.add_argument("--workers", type=int, default=4, help="Cycles processed concurrently.")
+    p.add_argument("--lead_workers", type=int, default=4, help="Leads downloaded concurrently per cycle.")
+    p.add_argument("--flush_every", type=int, default=50, help="Cycles per Parquet part / checkpoint.")
+    p.add_argument("--cache_dir", type=str, default=None,
+                   help="Also keep cropped subsets in this SubsetCache (off by default for backfills).")
+    p.add_argument("--cache_max_gb", type=float, default=get_gfs_forecast.DEFAULT_MAX_GB)
+    return p.parse_args()
+
+
+def init_times(start, end, cycles: list[int]) -> list[pd.Timestamp]:
+    """Every init in [start, end] at the given cycle hours, oldest first."""
+    days = pd.date_range(pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize(), freq="D")
+    return sorted(d + pd.Timedelta(hours=h) for d in days for h in sorted(set(cycles)))
+
+
+def job_name(init: pd.Timestamp) -> str:
+    return init.strftime("%Y%m%d%H")
+
+
+class FeatureChain:
+    """Anomaly + feature stages with the climatology loaded once and shared by all workers."""
+
+    def __init__(self, clim_nc: str, clim_store: str, regions=None):
+        self.clim_nc = clim_nc
+        self.clim_store = clim_store
+        self.regions = regions
+        self.clim = xr.open_dataset(clim_nc).load()
+        self.stores = build_forecast_climatology.StoreCache(clim_store, clim_nc, self.clim)
+
+    def features(self, fc: xr.Dataset, init: pd.Timestamp) -> pd.DataFrame:
+        store = self.stores.get(fc["latitude"], fc["longitude"])
+        anoms = compute_forecast_anomalies.compute_anomalies(fc, self.clim, clim_store=store)
+        feat = extract_forecast_features.extract_features(anoms, self.clim, clim_store=store,
+                                                          regions=self.regions)
+        feat.insert(0, "init_time", init)
+        return feat
+
+
+def remove_orphan_parts(out_dir: Path, manifest: Manifest) -> int:
+    """Delete parts (and temp files) written by a flush that never reached the manifest."""
+    known = {p for entry in manifest.jobs.values() for p in entry.get("parts", [])}
+    removed = 0
+    for f in out_dir.glob("year=*/*"):
+        if f.is_file() and f.relative_to(out_dir).as_posix() not in known:
+            f.unlink()
+            removed += 1
+    return removed
+
+
+def flush(rows: list[pd.DataFrame], leads: dict[str, list[int]], out_dir: Path, manifest: Manifest) -> int:
+    """Write buffered rows as one part per year, then checkpoint their cycles."""
+    df = pd.concat(rows, ignore_index=True)
+    tag = f"part-{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet"
+    parts_by_job: dict[str, list[str]] = {}
+    for year, part in df.groupby(df["init_time"].dt.year):
+        rel = f"year={year}/{tag}"
+        write_table(part, out_dir / rel, "gfs_backfill", partition=False)
+        for name in part["init_time"].map(job_name).unique():
+            parts_by_job.setdefault(name, []).append(rel)
+
+    updates = {}
+    for name, new_leads in leads.items():
+        entry = manifest.get(name)
+        updates[name] = dict(state="done", error=None, finished=time.time(),
+                             leads=sorted(set(entry.get("leads", [])) | set(new_leads)),
+                             parts=entry.get("parts", []) + parts_by_job.get(name, []))
+    manifest.update_many(updates)
+    return len(df)
+
+
+def run_backfill(jobs: list[tuple[pd.Timestamp, list[int]]], chain: FeatureChain, manifest: Manifest,
+                 out_dir: Path, fetch_opts: dict, workers: int = 4, lead_workers: int = 4,
+                 flush_every: int = 50) -> dict[str, int]:
+    """
+    Process (init, leads) jobs with at most `workers` cycles in flight.
+    Returns counts of done/failed cycles and rows written.
+    """
+    def work(init: pd.Timestamp, fxx: list[int]) -> pd.DataFrame:
+        fc = get_gfs_forecast.fetch_leads(fxx, init=init.strftime("%Y-%m-%d %H:%M"),
+                                          workers=lead_workers, **fetch_opts)
+        return chain.features(fc, init)
+
+    rows, leads = [], {}
+    counts = {"done": 0, "failed": 0, "rows": 0}
+    t0 = time.perf_counter()
+    pending = iter(jobs)
+    in_flight = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while True:
+            # Keep the queue short so memory stays bounded and flushes happen as we go
+            for init, fxx in pending:
+                in_flight[pool.submit(work, init, fxx)] = (init, fxx)
+                if len(in_flight) >= 2 * max(1, workers):
+                    break
+            if not in_flight:
+                break
+
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                init, fxx = in_flight.pop(fut)
+                name = job_name(init)
+                try:
+                    rows.append(fut.result())
+                    leads[name] = fxx
+                    counts["done"] += 1
+                except Exception as e:
+                    manifest.update(name, state="failed", error=repr(e), finished=time.time())
+                    counts["failed"] += 1
+                    print(f"FAILED: {init:%Y-%m-%d %H}z: {e}")
+
+            if len(leads) >= flush_every:
+                counts["rows"] += flush(rows, leads, out_dir, manifest)
+                rows, leads = [], {}
+                n = counts["done"] + counts["failed"]
+                rate = n / (time.perf_counter() - t0)
+                print(f"  checkpoint: {n}/{len(jobs)} cycles, {rate:.2f} cycles/s")
+
+    if leads:
+        counts["rows"] += flush(rows, leads, out_dir, manifest)
+    return counts
+
+
+def main():
+    args = parse_args()
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest = Manifest(Path(args.manifest) if args.manifest else out_dir.with_name(out_dir.name + "_manifest.json"))
+
+    removed = remove_orphan_parts(out_dir, manifest)
+    if removed:
+        print(f"Removed {removed} part file(s) from an interrupted flush.")
+
+    start, end, step = args.fxx_range
+    fxx_all = list(range(start, end + 1, step))
+    jobs, skipped = [], 0
+    for init in init_times(args.start, args.end, args.cycles):
+        entry = manifest.get(job_name(init))
+        todo = [f for f in fxx_all if f not in set(entry.get("leads", []))]
+        if todo:
+            jobs.append((init, todo))
+        else:
+            skipped += 1
+
+    regions = resolve_regions(args.regions) if args.regions else None
+    box = domain_box(regions) if regions else dict(south=args.south, north=args.north, west=args.west, east=args.east)
+    fetch_opts = dict(product=args.product, **box)
+    if args.cache_dir:
+        fetch_opts["cache"] = get_gfs_forecast.SubsetCache(args.cache_dir, args.cache_max_gb)
+
+    print(f"Cycles: {len(jobs)} to run, {skipped} already done; leads {fxx_all}")
+    print(f"Concurrency: {args.workers} cycles x {args.lead_workers} leads")
+
+    chain = FeatureChain(args.clim_nc, args.clim_store, regions=regions)
+    counts = run_backfill(jobs, chain, manifest, out_dir, fetch_opts, workers=args.workers,
+                          lead_workers=args.lead_workers, flush_every=args.flush_every)
+
+    print(f"\nDone. cycles={counts['done']} rows={counts['rows']} skipped={skipped} failed={counts['failed']}")
+    print(f"Features in {out_dir.resolve()}")
+    if counts["failed"]:
+        raise SystemExit(f"{counts['failed']} cycle(s) failed; see {manifest.path}. Re-run to retry.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,38 @@
+import argparse
+import time
+
 import joblib
 import pandas as pd
-import matplotlib.pyplot as plt
-from sklearn.model_selection import TimeSeriesSplit
 from sklearn.metrics import mean_absolute_error
-from config import PROCESSED_DIR, MODELS_DIR
-
-def main():
-    bundle = joblib.load(MODELS_DIR / "model.joblib")
-    model = bundle["model"]
-    feature_cols = bundle["feature_cols"]
-    target_col = bundle["target_col"]
-
-    df = pd.read_csv(PROCESSED_DIR / "model_table.csv", parse_dates=["date"]).sort_values("date")
-    df = df.dropna(subset=feature_cols + [target_col])
-
-    X = df[feature_cols]
-    y = df[target_col].values
-    dates = df["date"].values
-
-    tscv = TimeSeriesSplit(n_splits=5)
-    preds_all = [None] * len(df)
-
-    for train_idx, test_idx in tscv.split(X):
-        model.fit(X.iloc[train_idx], y[train_idx])
-        preds = model.predict(X.iloc[test_idx])
-        for i, p in zip(test_idx, preds):
-            preds_all[i] = float(p)
-
-    out = df[["date"]].copy()
-    out["y_true"] = y
-    out["y_pred"] = preds_all
-    out = out.dropna()
-
-    mae = mean_absolute_error(out["y_true"], out["y_pred"])
-    corr = out["y_true"].corr(out["y_pred"])
-
-    print(f"Backtest rows: {len(out)}")
-    print(f"Backtest MAE:  {mae:.6f}")
-    print(f"Correlation:   {corr:.3f}")
+from config import PROCESSED_DIR, MODELS_DIR, FIGURES_DIR
+from storage import read_table, write_table
+from ridge_stats import ridge_alpha
+from walkforward import REFIT_FREQ, fold_splits, oos_frame, run_splits, run_splits_stats, walk_splits
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Backtest the model with coarse folds or a walk-forward refit.")
+    p.add_argument("--mode", choices=["folds", "walk"], default="folds",
+                   help="folds: TimeSeriesSplit-style expanding folds; walk: refit every --refit period.")
+    p.add_argument("--n_splits", type=int, default=5, help="Number of folds with --mode folds.")
+    p.add_argument("--refit", choices=list(REFIT_FREQ), default="monthly")
+    p.add_argument("--window", choices=["expanding", "rolling"], default="expanding")
+    p.add_argument("--window_rows", type=int, default=756, help="Training rows for a rolling window (~3y).")
+    p.add_argument("--min_train", type=int, default=252, help="Rows required before the first refit.")
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--engine", choices=["auto", "stats", "sklearn"], default="auto",
+                   help="stats: batched Ridge from prefix sums (StandardScaler+Ridge models only); "
+                        "sklearn: clone and refit the bundled model per split; auto: stats when possible.")
+    p.add_argument("--out", type=str, default="data/processed/backtest_oos.parquet",
+                   help="Out-of-sample predictions with their fold and training window.")
+    p.add_argument("--no_plots", action="store_true")
+    return p.parse_args()
+
+
+def plot_backtest(out: pd.DataFrame, calib: pd.DataFrame) -> None:
+    import matplotlib.pyplot as plt
+
+    FIGURES_DIR.mkdir(parents=True, exist_ok=True)
 
     # Plot 1: time series (pred vs actual)
     plt.figure()
@@ -61,19 +56,6 @@ def main():
     plt.savefig("reports/figures/backtest_scatter.png", dpi=150)
     plt.close()
 
-        # --- Calibration by bins (quintiles) ---
-    out2 = out.copy()
-    out2["pred_bin"] = pd.qcut(out2["y_pred"], q=5, duplicates="drop")
-
-    calib = out2.groupby("pred_bin").agg(
-        pred_mean=("y_pred", "mean"),
-        actual_mean=("y_true", "mean"),
-        count=("y_true", "size"),
-    ).reset_index()
-
-    print("\nCalibration (quintiles of predicted risk):")
-    print(calib.to_string(index=False))
-
     # Bar plot: actual_mean by bin
     plt.figure()
     plt.bar(range(len(calib)), calib["actual_mean"].values)
@@ -84,13 +66,75 @@ def main():
     plt.savefig("reports/figures/backtest_calibration_bins.png", dpi=150)
     plt.close()
 
-    print(" - reports/figures/backtest_calibration_bins.png")
-
-
     print("Saved:")
     print(" - reports/figures/backtest_pred_vs_actual.png")
     print(" - reports/figures/backtest_scatter.png")
+    print(" - reports/figures/backtest_calibration_bins.png")
+
+
+def main():
+    args = parse_args()
+    bundle = joblib.load(MODELS_DIR / "model.joblib")
+    model = bundle["model"]
+    feature_cols = bundle["feature_cols"]
+    target_col = bundle["target_col"]
+
+    df = read_table(PROCESSED_DIR / "model_table.parquet", "model_table",
+                    columns=["date"] + feature_cols + [target_col])
+    df = df.dropna(subset=feature_cols + [target_col]).sort_values("date", kind="stable")
+
+    X = df[feature_cols].to_numpy(dtype=float)
+    y = df[target_col].to_numpy(dtype=float)
+    dates = pd.DatetimeIndex(df["date"])
+
+    if args.mode == "folds":
+        splits = fold_splits(len(df), args.n_splits)
+    else:
+        splits = walk_splits(dates, refit=args.refit, window=args.window,
+                             window_rows=args.window_rows, min_train=args.min_train)
+
+    alpha = ridge_alpha(model)
+    engine = args.engine
+    if engine == "auto":
+        engine = "stats" if alpha is not None else "sklearn"
+    if engine == "stats" and alpha is None:
+        raise SystemExit("--engine stats needs a StandardScaler + Ridge model bundle.")
+
+    t = time.perf_counter()
+    if engine == "stats":
+        pred, fold = run_splits_stats(X, y, splits, alpha)
+        how = "sufficient statistics"
+    else:
+        pred, fold = run_splits(model, X, y, splits, workers=args.workers)
+        how = f"{args.workers} workers"
+    print(f"Fitted {len(splits)} splits in {time.perf_counter() - t:.2f}s ({how})")
+
+    out = oos_frame(dates, y, pred, fold, splits)
+    out_path = write_table(out, args.out, "backtest_oos")
+    print(f"Saved out-of-sample predictions to {out_path}")
+
+    mae = mean_absolute_error(out["y_true"], out["y_pred"])
+    corr = out["y_true"].corr(out["y_pred"])
+
+    print(f"Backtest rows: {len(out)}")
+    print(f"Backtest MAE:  {mae:.6f}")
+    print(f"Correlation:   {corr:.3f}")
+
+    # --- Calibration by bins (quintiles) ---
+    out2 = out.copy()
+    out2["pred_bin"] = pd.qcut(out2["y_pred"], q=5, duplicates="drop")
+
+    calib = out2.groupby("pred_bin", observed=True).agg(
+        pred_mean=("y_pred", "mean"),
+        actual_mean=("y_true", "mean"),
+        count=("y_true", "size"),
+    ).reset_index()
+
+    print("\nCalibration (quintiles of predicted risk):")
+    print(calib.to_string(index=False))
 
+    if not args.no_plots:
+        plot_backtest(out, calib)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,124 @@
+# src/bench_startup.py
+"""
+Startup-time benchmark for the `python -m src` commands.
+
+For every command it runs a fresh interpreter that only imports the command's
+module (best of --repeat runs) and records which heavy libraries got pulled
+in. Quick commands must stay under --quick_budget_s and must not import any
+heavy library. With --baseline, import times are compared to a saved JSON
+and a slowdown beyond --tolerance fails the run (exit code 1), so this can
+gate changes that add top-level imports.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from cli import COMMANDS, SRC_DIR
+
+HEAVY = ["xarray", "pandas", "sklearn", "matplotlib", "scipy", "pyarrow", "joblib", "herbie"]
+
+# Commands that must start fast and stay free of heavy imports
+QUICK = ["--help", "latest"]
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Measure startup/import time of every command.")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--quick_budget_s", type=float, default=0.5)
+    p.add_argument("--baseline", type=str, default=None, help="JSON of previous import times to compare to.")
+    p.add_argument("--save_baseline", type=str, default=None)
+    p.add_argument("--tolerance", type=float, default=0.5, help="Allowed relative slowdown vs baseline.")
+    return p.parse_args()
+
+
+_PROBE = """
+import json, sys, time
+t = time.perf_counter()
+{body}
+dt = time.perf_counter() - t
+heavy = sorted(m for m in {heavy!r} if m in sys.modules)
+print(json.dumps([dt, heavy]))
+"""
+
+
+def _measure(body: str, repeat: int, cwd: Path) -> tuple[float, list[str]]:
+    best, heavy = float("inf"), []
+    code = _PROBE.format(body=body, heavy=HEAVY)
+    for _ in range(repeat):
+        r = subprocess.run([sys.executable, "-c", code], cwd=cwd, capture_output=True, text=True)
+        if r.returncode != 0:
+            raise RuntimeError(r.stderr.strip().splitlines()[-1] if r.stderr.strip() else "probe failed")
+        dt, heavy = json.loads(r.stdout.strip().splitlines()[-1])
+        best = min(best, dt)
+    return best, heavy
+
+
+def _measure_quick(argv: list[str], repeat: int, cwd: Path) -> tuple[float, list[str]]:
+    """Wall time of a whole `python -m src ...` process, plus heavy modules it imported."""
+    best = float("inf")
+    code = ("import json, runpy, sys; sys.argv = ['src', *{argv!r}]\n"
+            "try:\n    runpy.run_module('src', run_name='__main__')\n"
+            "except SystemExit:\n    pass\n"
+            "print(json.dumps(sorted(m for m in {heavy!r} if m in sys.modules)), file=sys.stderr)")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        r = subprocess.run([sys.executable, "-c", code.format(argv=argv, heavy=HEAVY)],
+                           cwd=cwd, capture_output=True, text=True)
+        best = min(best, time.perf_counter() - t)
+    heavy = json.loads(r.stderr.strip().splitlines()[-1])
+    return best, heavy
+
+
+def main():
+    args = parse_args()
+    root = SRC_DIR.parent
+    failures = []
+
+    print(f"{'command':<16} {'seconds':>8}  heavy imports")
+    for cmd in QUICK:
+        dt, heavy = _measure_quick([cmd], args.repeat, root)
+        print(f"{cmd:<16} {dt:8.3f}  {', '.join(heavy) or '-'}")
+        if dt > args.quick_budget_s:
+            failures.append(f"{cmd}: {dt:.3f}s > budget {args.quick_budget_s:.3f}s")
+        if heavy:
+            failures.append(f"{cmd}: imports heavy modules {heavy}")
+
+    times = {}
+    for cmd, (module, _) in COMMANDS.items():
+        if module is None or cmd == "bench-startup":
+            continue
+        body = f"sys.path.insert(0, {str(SRC_DIR)!r})\nimport {module}"
+        try:
+            dt, heavy = _measure(body, args.repeat, root)
+        except RuntimeError as e:
+            print(f"{cmd:<16} {'n/a':>8}  ({e})")
+            continue
+        times[cmd] = dt
+        print(f"{cmd:<16} {dt:8.3f}  {', '.join(heavy) or '-'}")
+
+    if args.baseline and Path(args.baseline).exists():
+        base = json.loads(Path(args.baseline).read_text())
+        for cmd, dt in times.items():
+            if cmd in base and dt > base[cmd] * (1 + args.tolerance):
+                failures.append(f"{cmd}: import {dt:.3f}s vs baseline {base[cmd]:.3f}s")
+
+    if args.save_baseline:
+        Path(args.save_baseline).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.save_baseline).write_text(json.dumps(times, indent=2))
+        print(f"Saved baseline to {args.save_baseline}")
+
+    if failures:
+        print("\nStartup regressions:")
+        for f in failures:
+            print(f" - {f}")
+        sys.exit(1)
+    print("\nStartup OK.")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,18 @@
 from __future__ import annotations
 
 import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
+import numpy as np
 import xarray as xr
 
+import precision
+from daily_agg import daily_stats
+from doy_accumulator import DoyAccumulator
+from era5_stream import REQUIRED, iter_hourly_windows, normalize_varnames
+from era5_zarr import open_archive
+from utils import read_json, refresh_fingerprint, write_json_atomic
+
 
 def parse_args():
     p = argparse.ArgumentParser(description="Build day-of-year climatology from ERA5.")
@@ -12,29 +21,119 @@ def parse_args():
     g.add_argument("--era5_daily_nc", type=str, help="Single ERA5 DAILY NetCDF with t2m/u10/v10.")
     g.add_argument("--daily_dir", type=str, help="Directory of ERA5 DAILY NetCDFs.")
     g.add_argument("--hourly_dir", type=str, help="Directory of ERA5 HOURLY NetCDFs (will be aggregated to daily).")
+    g.add_argument("--zarr", type=str, help="Space-chunked ERA5 hourly archive from era5_zarr.py.")
     p.add_argument("--out", type=str, default="data/processed/climatology_doy.nc")
+    p.add_argument("--precision", type=str, choices=precision.POLICIES, default=precision.DEFAULT_POLICY,
+                   help="On-disk precision of the climatology (see precision.py).")
+    # --hourly_dir files are streamed one at a time (or in --window_days windows)
+    p.add_argument("--window_days", type=int, default=None,
+                   help="Split each hourly file into windows of this many days.")
+    p.add_argument("--max_rss_gb", type=float, default=None,
+                   help="Size windows to keep process memory under this limit.")
+    # --hourly_dir keeps per-doy accumulators so new months fold in incrementally
+    p.add_argument("--accum_dir", type=str, default="data/processed/climatology_accum")
+    p.add_argument("--workers", type=int, default=None, help="Processes for the per-file (or per-tile) map step.")
+    p.add_argument("--full_rebuild", action="store_true",
+                   help="Ignore the saved accumulator and re-read every file.")
     return p.parse_args()
 
 
-def normalize_varnames(ds: xr.Dataset) -> xr.Dataset:
-    # Try common ERA5 variable naming; adjust here if yours differs.
-    rename = {}
-    for v in list(ds.data_vars):
-        lv = v.lower()
-        if lv in ["t2m", "2t"] and "t2m" not in ds.data_vars:
-            rename[v] = "t2m"
-        if lv in ["u10", "10u"] and "u10" not in ds.data_vars:
-            rename[v] = "u10"
-        if lv in ["v10", "10v"] and "v10" not in ds.data_vars:
-            rename[v] = "v10"
-    if rename:
-        ds = ds.rename(rename)
-
-    # Kelvin -> Celsius for t2m
-    if "t2m" in ds and float(ds["t2m"].max()) > 200:
-        ds["t2m"] = ds["t2m"] - 273.15
-
-    return ds
+def daily_mean(ds_hr: xr.Dataset) -> xr.Dataset:
+    # Aggregate HOURLY -> DAILY mean
+    return daily_stats(ds_hr, REQUIRED)
+
+
+def file_accumulator(path: Path, window_days: int | None = None,
+                     max_rss_gb: float | None = None) -> dict:
+    """Map step: per-doy count/mean/M2 of the daily means in one hourly file."""
+    acc = None
+    for win in iter_hourly_windows([path], window_days=window_days, max_rss_gb=max_rss_gb):
+        day = daily_mean(win)
+        if acc is None:
+            acc = DoyAccumulator(REQUIRED, day["latitude"].values, day["longitude"].values)
+        acc.add_daily(day)
+    if acc is None:
+        raise FileNotFoundError(f"No data in {path}")
+    return acc.partial()
+
+
+def update_accumulator(files: list[Path], state_dir: Path, workers: int | None = None,
+                       window_days: int | None = None, max_rss_gb: float | None = None,
+                       full_rebuild: bool = False) -> DoyAccumulator:
+    """
+    Fold every not-yet-included file into the saved accumulator, running the
+    per-file map step in a process pool. If an included file changed or
+    disappeared its contribution cannot be removed, so everything is rebuilt.
+    """
+    state_path = state_dir / "state.npz"
+    index_path = state_dir / "index.json"
+    index = read_json(index_path, default={}) if not full_rebuild else {}
+    included = index.get("files", {})
+
+    names = {f.name for f in files}
+    todo, fps = [], {}
+    for f in files:
+        fp, changed = refresh_fingerprint(f, included.get(f.name))
+        fps[f.name] = fp
+        if f.name in included and changed:
+            print(f"{f.name} changed since it was folded in; rebuilding from scratch.")
+            included = {}
+        elif f.name not in included:
+            todo.append(f)
+    if any(n not in names for n in included):
+        print("Files were removed since the last build; rebuilding from scratch.")
+        included = {}
+    if not included:
+        todo = list(files)
+
+    acc = DoyAccumulator.load(state_path) if included and state_path.exists() else None
+    if acc is None and included:
+        included, todo = {}, list(files)
+    print(f"Folding {len(todo)} new file(s) into climatology ({len(included)} already included)")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(file_accumulator, f, window_days, max_rss_gb): f for f in todo}
+        for fut in as_completed(futures):
+            part = fut.result()
+            if acc is None:
+                acc = DoyAccumulator(REQUIRED, part["latitude"], part["longitude"])
+            acc.merge(part)
+            included[futures[fut].name] = fps[futures[fut].name]
+
+    if acc is None:
+        raise FileNotFoundError("No hourly data found.")
+
+    acc.save(state_path)
+    write_json_atomic(index_path, {"files": included})
+    return acc
+
+
+def tile_climatology(store: str, lat: slice, lon: slice, dtype=np.float64) -> xr.Dataset:
+    """Map step for --zarr: the full history of one lat/lon tile -> its doy mean/std."""
+    with open_archive(store) as ds:
+        tile = ds.isel(latitude=lat, longitude=lon).load()
+    acc = DoyAccumulator(REQUIRED, tile["latitude"].values, tile["longitude"].values)
+    acc.add_daily(daily_mean(tile))
+    return acc.to_dataset(dtype=dtype)
+
+
+def archive_climatology(store: str, workers: int | None = None, dtype=np.float64) -> xr.Dataset:
+    """
+    Climatology from a space-chunked archive, one storage tile per task: each
+    task reads whole chunks covering its tile's full history, so nothing is
+    read twice and no task needs more than one tile in memory.
+    """
+    with open_archive(store) as ds:
+        _, tlat, tlon = ds["t2m"].encoding["chunks"]
+        nlat, nlon = ds.sizes["latitude"], ds.sizes["longitude"]
+    lat_tiles = [slice(i, min(i + tlat, nlat)) for i in range(0, nlat, tlat)]
+    lon_tiles = [slice(j, min(j + tlon, nlon)) for j in range(0, nlon, tlon)]
+    print(f"Climatology over {len(lat_tiles) * len(lon_tiles)} tile(s) of {tlat}x{tlon} cells")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        rows = [[pool.submit(tile_climatology, store, a, b, dtype) for b in lon_tiles] for a in lat_tiles]
+        rows = [xr.concat([f.result() for f in row], dim="longitude") for row in rows]
+    return xr.concat(rows, dim="latitude")
 
 
 def open_from_dir(d: Path) -> xr.Dataset:
@@ -44,49 +143,44 @@ def open_from_dir(d: Path) -> xr.Dataset:
     return xr.open_mfdataset(files, combine="by_coords")
 
 
+def daily_climatology(ds: xr.Dataset) -> xr.Dataset:
+    missing = [v for v in REQUIRED if v not in ds.data_vars]
+    if missing:
+        raise SystemExit(f"Missing required vars: {missing}. Found: {list(ds.data_vars)}")
+
+    # Day-of-year climatology
+    clim = ds[REQUIRED].groupby(ds["time"].dt.dayofyear).mean("time")
+    if "dayofyear" in clim.dims:
+        clim = clim.rename({"dayofyear": "doy"})
+    return clim
+
+
 def main():
     args = parse_args()
 
     if args.era5_daily_nc:
         ds = xr.open_dataset(args.era5_daily_nc)
-        ds = normalize_varnames(ds)
+        clim = daily_climatology(normalize_varnames(ds))
 
     elif args.daily_dir:
         ds = open_from_dir(Path(args.daily_dir))
-        ds = normalize_varnames(ds)
+        clim = daily_climatology(normalize_varnames(ds))
 
-    else:  # hourly_dir
-        ds_hr = open_from_dir(Path(args.hourly_dir))
-        ds_hr = normalize_varnames(ds_hr)
-
-        # Some datasets use valid_time instead of time
-        if "time" not in ds_hr.dims:
-            if "valid_time" in ds_hr.dims:
-                ds_hr = ds_hr.rename({"valid_time": "time"})
-            elif "valid_time" in ds_hr.coords:
-                ds_hr = ds_hr.set_coords("valid_time").rename({"valid_time": "time"})
-
-        required = ["t2m", "u10", "v10"]
-        missing = [v for v in required if v not in ds_hr.data_vars]
-        if missing:
-            raise SystemExit(f"Missing vars in hourly ERA5: {missing}. Found: {list(ds_hr.data_vars)}")
-
-        # Aggregate HOURLY -> DAILY mean
-        ds = ds_hr[required].resample(time="1D").mean()
-
-    required = ["t2m", "u10", "v10"]
-    missing = [v for v in required if v not in ds.data_vars]
-    if missing:
-        raise SystemExit(f"Missing required vars: {missing}. Found: {list(ds.data_vars)}")
+    elif args.zarr:
+        clim = archive_climatology(args.zarr, workers=args.workers,
+                                   dtype=precision.compute_dtype(args.precision))
 
-    # Day-of-year climatology
-    clim = ds[required].groupby(ds["time"].dt.dayofyear).mean("time")
-    if "dayofyear" in clim.dims:
-        clim = clim.rename({"dayofyear": "doy"})
-
-    out_path = Path(args.out)
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    clim.to_netcdf(out_path)
+    else:  # hourly_dir
+        files = sorted(Path(args.hourly_dir).glob("*.nc"))
+        if not files:
+            raise FileNotFoundError(f"No .nc files found in {args.hourly_dir}")
+        acc = update_accumulator(files, Path(args.accum_dir), workers=args.workers,
+                                 window_days=args.window_days, max_rss_gb=args.max_rss_gb,
+                                 full_rebuild=args.full_rebuild)
+        # Mean plus per-doy std (t2m_std, ...) for standardized anomalies
+        clim = acc.to_dataset(dtype=precision.compute_dtype(args.precision))
+
+    out_path = precision.to_netcdf(precision.as_compute(clim, args.precision), args.out, args.precision)
     print(f"Saved climatology to {out_path.resolve()}")
 
 
@@ -2,7 +2,7 @@
 
 import numpy as np
 import pandas as pd
-from config import PROCESSED_DIR
+from config import PROCESSED_DIR, ensure_parent
 
 def main():
     rng = np.random.default_rng(42)
@@ -25,7 +25,7 @@ def main():
         "demand_mw": demand
     })
 
-    out_path = PROCESSED_DIR / "modeling_table.parquet"
+    out_path = ensure_parent(PROCESSED_DIR / "modeling_table.parquet")
     df.to_parquet(out_path, index=False)
     print(f"Saved: {out_path} ({len(df)} rows)")
 
@@ -3,102 +3,196 @@ import argparse
 from pathlib import Path
 import pandas as pd
 import xarray as xr
-import numpy as np
+
+from daily_agg import STATS, daily_stats
+from era5_stream import iter_archive_windows, iter_hourly_windows
+from era5_zarr import archive_index, open_archive
+from features import EXTREME_COLS, features_from_fields, regional_means
+from regions import Region, RegionMask, long_frame, region_spec, resolve_regions
+from storage import read_table, write_table
+from utils import read_json, refresh_fingerprint, write_json_atomic
 
 def parse_args():
     p = argparse.ArgumentParser()
     p.add_argument("--hourly_dir", type=str, default="data/raw/era5_hourly_monthly")
+    p.add_argument("--zarr", type=str, default=None,
+                   help="Read the time-chunked ERA5 archive from era5_zarr.py instead of --hourly_dir.")
     p.add_argument("--clim_nc", type=str, default="data/processed/climatology_doy.nc")
-    p.add_argument("--out", type=str, default="data/processed/era5_features.csv")
+    p.add_argument("--out", type=str, default=None,
+                   help="Default: data/processed/era5_features.parquet (era5_region_features.parquet with --regions)")
     # thresholds (C) for “extreme area” feature
     p.add_argument("--hot_thresh", type=float, default=8.0)
     p.add_argument("--cold_thresh", type=float, default=-8.0)
+    # month-partitioned store: one partition per monthly source file
+    p.add_argument("--store_dir", type=str, default=None,
+                   help="Default: data/processed/era5_features_parts (era5_region_features_parts with --regions)")
+    # several regions in one pass: one row per (date, region), area-weighted
+    p.add_argument("--regions", type=str, nargs="+", default=None,
+                   help="Region names (see regions.DEFAULT_REGIONS), 'all', or a regions .json file.")
+    p.add_argument("--daily_extremes", action="store_true",
+                   help=f"Also write regional means of daily Tmax/Tmin/diurnal range ({', '.join(EXTREME_COLS)}).")
+    p.add_argument("--full_rebuild", action="store_true",
+                   help="Ignore stored fingerprints and rebuild every partition.")
+    # each monthly file is streamed on its own; these bound memory further
+    p.add_argument("--window_days", type=int, default=None,
+                   help="Split each hourly file into windows of this many days.")
+    p.add_argument("--max_rss_gb", type=float, default=None,
+                   help="Size windows to keep process memory under this limit.")
     return p.parse_args()
 
-def open_hourly(hourly_dir: Path) -> xr.Dataset:
+def daily_features(ds_hr: xr.Dataset, clim: xr.Dataset, hot_thresh: float = 8.0,
+                   cold_thresh: float = -8.0, regions: dict[str, Region] | None = None,
+                   extremes: bool = False) -> pd.DataFrame:
+    """
+    Hourly ERA5 (any time span) -> one row of regional features per day, or
+    with regions one row per (day, region) from the same pass. With extremes,
+    EXTREME_COLS are added from the same hourly -> daily pass over t2m.
+    """
+    # Ensure Kelvin -> C if needed
+    if float(ds_hr["t2m"].max()) > 200:
+        ds_hr["t2m"] = ds_hr["t2m"] - 273.15
+
+    # Hourly -> daily mean (plus max/min/range of t2m for the extremes)
+    ds_day = xr.merge([daily_stats(ds_hr, ["t2m"], STATS if extremes else ["mean"]),
+                       daily_stats(ds_hr, ["u10", "v10"])])
+    ds_day = ds_day.transpose("time", "latitude", "longitude")
+
+    # Climatology row for each day (by day-of-year), on the ERA5 grid
+    clim = clim.sel(latitude=ds_day["latitude"], longitude=ds_day["longitude"])
+    clim = clim.transpose("doy", "latitude", "longitude")
+    clim_idx = pd.Index(clim["doy"].values).get_indexer(ds_day["time"].dt.dayofyear.values)
+    if (clim_idx < 0).any():
+        raise KeyError("Climatology is missing some day-of-year values in this period.")
+
+    # All regional features in one fused pass (shared with the forecast path)
+    mask = None if regions is None else RegionMask(regions, ds_day["latitude"].values, ds_day["longitude"].values)
+    feats = features_from_fields(
+        ds_day["t2m"].data, ds_day["u10"].data, ds_day["v10"].data,
+        clim["t2m"].values, clim["u10"].values, clim["v10"].values, clim_idx,
+        hot_thresh=hot_thresh, cold_thresh=cold_thresh, mask=mask,
+    )
+    if extremes:
+        feats.update(regional_means({c: ds_day[f"t2m_{s}"].values
+                                     for c, s in zip(EXTREME_COLS, ["max", "min", "range"])}, mask=mask))
+
+    dates = pd.to_datetime(ds_day["time"].values).normalize()
+    if mask is not None:
+        return long_frame(feats, mask.names, {"date": dates})
+    out = pd.DataFrame(feats)
+    out.insert(0, "date", dates)
+    return out
+
+def hourly_sources(hourly_dir: Path, window_days: int | None = None,
+                   max_rss_gb: float | None = None) -> list[tuple]:
+    """(name, fingerprint fn, windows fn) for each monthly file in hourly_dir."""
     files = sorted(hourly_dir.glob("*.nc"))
     if not files:
         raise FileNotFoundError(f"No .nc files found in {hourly_dir}")
-
-    ds = xr.open_mfdataset(files, combine="by_coords")
-
-    # Normalize time coordinate name
-    if "time" not in ds.dims and "valid_time" in ds.dims:
-        ds = ds.rename({"valid_time": "time"})
-
-    return ds
+    return [(f.name, lambda old, f=f: refresh_fingerprint(f, old),
+             lambda f=f: iter_hourly_windows([f], window_days=window_days, max_rss_gb=max_rss_gb))
+            for f in files]
+
+
+def archive_sources(archive: Path, window_days: int | None = None,
+                    max_rss_gb: float | None = None) -> list[tuple]:
+    """
+    Same as hourly_sources() for the monthly files held in an era5_zarr
+    archive; fingerprints are the archived files', so partitions built from
+    either source are interchangeable.
+    """
+    ds = open_archive(archive)
+    out = []
+    for name, e in sorted(archive_index(archive)["files"].items()):
+        fp = {k: e[k] for k in ("size", "mtime_ns", "sha256")}
+        out.append((name, lambda old, fp=fp: (fp, not old or old.get("sha256") != fp["sha256"]),
+                    lambda e=e: iter_archive_windows(ds, e["start"], e["end"], window_days=window_days,
+                                                     max_rss_gb=max_rss_gb)))
+    return out
+
+
+def update_store(sources: list[tuple], store_dir: Path, clim_nc: Path, hot_thresh: float,
+                 cold_thresh: float, full_rebuild: bool = False,
+                 regions: dict[str, Region] | None = None, extremes: bool = False) -> pd.DataFrame:
+    """
+    Bring the month-partitioned feature store up to date and return all rows.
+
+    The store index records a fingerprint (size/mtime/sha256) per source file,
+    plus the climatology fingerprint and thresholds. Only partitions whose
+    source changed (or that are missing) are recomputed; if the climatology
+    or thresholds change, every partition is stale.
+    """
+
+    store_dir.mkdir(parents=True, exist_ok=True)
+    index_path = store_dir / "_index.json"
+    index = read_json(index_path, default={})
+
+    clim_fp, _ = refresh_fingerprint(clim_nc, index.get("clim"))
+    params = {"hot_thresh": hot_thresh, "cold_thresh": cold_thresh}
+    if regions is not None:
+        params["regions"] = region_spec(regions)
+    if extremes:
+        params["daily_extremes"] = True
+    if (full_rebuild or index.get("params") != params
+            or index.get("clim", {}).get("sha256") != clim_fp["sha256"]):
+        index = {}
+    index["clim"] = clim_fp
+    index["params"] = params
+    parts = index.setdefault("parts", {})
+
+    clim = None
+    rebuilt = 0
+    for name, fingerprint, windows in sources:
+        part_path = store_dir / f"{Path(name).stem}.parquet"
+        fp, changed = fingerprint(parts.get(name))
+        if not changed and part_path.exists():
+            parts[name] = fp
+            continue
+
+        if clim is None:
+            clim = xr.open_dataset(clim_nc).load()
+        print(f"Building partition {part_path.name} from {name}")
+        df = pd.concat([
+            daily_features(win, clim, hot_thresh, cold_thresh, regions=regions, extremes=extremes)
+            for win in windows()
+        ], ignore_index=True)
+        write_table(df, part_path, "era5_features", partition=False)
+        parts[name] = fp
+        rebuilt += 1
+        # Save after each partition so an interrupted run resumes where it stopped
+        write_json_atomic(index_path, index)
+
+    # Drop partitions whose source file has disappeared
+    names = [name for name, _, _ in sources]
+    for name in [n for n in parts if n not in names]:
+        (store_dir / f"{Path(name).stem}.parquet").unlink(missing_ok=True)
+        del parts[name]
+    write_json_atomic(index_path, index)
+    print(f"Partitions rebuilt: {rebuilt} / {len(sources)}")
+
+    df = pd.concat([read_table(store_dir / f"{Path(n).stem}.parquet", "era5_features") for n in names],
+                   ignore_index=True)
+    # Upsert semantics: a later partition wins for any overlapping date
+    key = ["date"] if regions is None else ["date", "region"]
+    return df.drop_duplicates(subset=key, keep="last").sort_values(key).reset_index(drop=True)
 
 def main():
     args = parse_args()
-    hourly_dir = Path(args.hourly_dir)
-    clim = xr.open_dataset(args.clim_nc)
-
-    ds_hr = open_hourly(hourly_dir)
-
-    # Ensure Kelvin -> C if needed
-    if float(ds_hr["t2m"].max()) > 200:
-        ds_hr["t2m"] = ds_hr["t2m"] - 273.15
-
-    # Hourly -> daily mean
-    ds_day = ds_hr[["t2m", "u10", "v10"]].resample(time="1D").mean()
-
-    # Compute anomalies by day-of-year
-    doy = ds_day["time"].dt.dayofyear
-    Tc = clim["t2m"].sel(doy=doy)
-    Uc = clim["u10"].sel(doy=doy)
-    Vc = clim["v10"].sel(doy=doy)
-
-    t_anom = ds_day["t2m"] - Tc
-    u_anom = ds_day["u10"] - Uc
-    v_anom = ds_day["v10"] - Vc
-    wind_anom_mag = np.sqrt(u_anom**2 + v_anom**2)
-
-    # Degree days (base 18C)
-    base = 18.0
-    t_daily = ds_day["t2m"]
-    t_clim = Tc
-
-    cdd = (t_daily - base).clip(min=0.0)
-    hdd = (base - t_daily).clip(min=0.0)
-
-    cdd_clim = (t_clim - base).clip(min=0.0)
-    hdd_clim = (base - t_clim).clip(min=0.0)
-
-    cdd_anom = cdd - cdd_clim
-    hdd_anom = hdd - hdd_clim
-
-    cdd_mean = cdd.mean(dim=("latitude", "longitude"))
-    hdd_mean = hdd.mean(dim=("latitude", "longitude"))
-    cdd_anom_mean = cdd_anom.mean(dim=("latitude", "longitude"))
-    hdd_anom_mean = hdd_anom.mean(dim=("latitude", "longitude"))
-
-
-    # Feature extraction over region (mean/max + “extreme area fraction”)
-    t_mean = t_anom.mean(dim=("latitude", "longitude"))
-    t_max = t_anom.max(dim=("latitude", "longitude"))
-    t_min = t_anom.min(dim=("latitude", "longitude"))
-    hot_frac = (t_anom > args.hot_thresh).mean(dim=("latitude", "longitude"))
-    cold_frac = (t_anom < args.cold_thresh).mean(dim=("latitude", "longitude"))
-    wind_mean = wind_anom_mag.mean(dim=("latitude", "longitude"))
-
-    out = pd.DataFrame({
-        "date": pd.to_datetime(ds_day["time"].values).date,
-        "t2m_anom_mean_c": t_mean.values,
-        "t2m_anom_max_c": t_max.values,
-        "t2m_anom_min_c": t_min.values,
-        "hot_area_frac": hot_frac.values,
-        "cold_area_frac": cold_frac.values,
-        "wind_anom_mag_mean": wind_mean.values,
-        "cdd_mean": cdd_mean.values,
-        "hdd_mean": hdd_mean.values,
-        "cdd_anom_mean": cdd_anom_mean.values,
-        "hdd_anom_mean": hdd_anom_mean.values,
-
-    })
-
-    out_path = Path(args.out)
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    out.to_csv(out_path, index=False)
+    regions = resolve_regions(args.regions) if args.regions else None
+    name = "era5_features" if regions is None else "era5_region_features"
+    out_file = args.out or f"data/processed/{name}.parquet"
+    store_dir = args.store_dir or f"data/processed/{name}_parts"
+
+    window_opts = dict(window_days=args.window_days, max_rss_gb=args.max_rss_gb)
+    if args.zarr:
+        sources = archive_sources(Path(args.zarr), **window_opts)
+    else:
+        sources = hourly_sources(Path(args.hourly_dir), **window_opts)
+
+    out = update_store(sources, Path(store_dir), Path(args.clim_nc),
+                       args.hot_thresh, args.cold_thresh, full_rebuild=args.full_rebuild, regions=regions,
+                       extremes=args.daily_extremes)
+
+    out_path = write_table(out, out_file, "era5_features")
     print(f"Saved ERA5 features to {out_path.resolve()}")
 
 if __name__ == "__main__":
@@ -0,0 +1,181 @@
+# src/build_forecast_climatology.py
+"""
+Put the day-of-year climatology on the GFS forecast grid once, as
+memory-mappable arrays, so forecast runs read one contiguous slice per doy
+instead of decoding NetCDF and interpolating every time.
+
+Store layout (--out_dir):
+    t2m.npy, u10.npy, v10.npy   float32, shape (366, lat, lon), row = doy - 1
+    meta.json                   grid coordinates, doys present, source fingerprint
+"""
+from __future__ import annotations
+
+import argparse
+import threading
+from pathlib import Path
+
+import numpy as np
+import xarray as xr
+
+from regrid import DEFAULT_CACHE_DIR, get_weights, grid_key, regrid
+from utils import file_fingerprint, read_json, write_json_atomic
+
+VARS = ["t2m", "u10", "v10"]
+DEFAULT_STORE = "data/processed/clim_fcgrid"
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Precompute the climatology on the forecast grid.")
+    p.add_argument("--clim_nc", type=str, default="data/processed/climatology_doy.nc")
+    p.add_argument("--grid_nc", type=str, default=None,
+                   help="Any forecast file on the target grid (e.g. gfs_subset.nc). "
+                        "Default: build the GFS 0.25° grid from the box below.")
+    p.add_argument("--south", type=float, default=25.0)
+    p.add_argument("--north", type=float, default=37.0)
+    p.add_argument("--west", type=float, default=-107.0)
+    p.add_argument("--east", type=float, default=-93.0)
+    p.add_argument("--res", type=float, default=0.25)
+    p.add_argument("--out_dir", type=str, default=DEFAULT_STORE)
+    return p.parse_args()
+
+
+def gfs_grid(south: float, north: float, west: float, east: float, res: float = 0.25):
+    """GFS-style subset coordinates: latitude descending, longitude ascending (-180..180)."""
+    lat = np.round(np.arange(north, south - res / 2, -res), 6)
+    lon = np.round(np.arange(west, east + res / 2, res), 6)
+    return lat, lon
+
+
+def build_store(clim: xr.Dataset, latitude: np.ndarray, longitude: np.ndarray, out_dir: Path,
+                source: dict | None = None) -> None:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    clim = clim[VARS].transpose("doy", "latitude", "longitude")
+    doys = clim["doy"].values.astype(int)
+
+    W, valid = get_weights(clim["latitude"].values, clim["longitude"].values, latitude, longitude)
+
+    # One sparse matmul for every (doy, var): (n_src, ndoy*nvar) -> (n_dst, ndoy*nvar)
+    nsrc = clim.sizes["latitude"] * clim.sizes["longitude"]
+    X = np.concatenate([clim[v].values.reshape(len(doys), nsrc).T for v in VARS], axis=1)
+    Y = W @ X.astype(np.float64)
+    Y[~valid] = np.nan
+
+    shape = (len(latitude), len(longitude))
+    for k, v in enumerate(VARS):
+        block = Y[:, k * len(doys):(k + 1) * len(doys)].T.reshape(len(doys), *shape)
+        tmp = out_dir / f"{v}.tmp.npy"
+        arr = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(366, *shape))
+        arr[:] = np.nan
+        arr[doys - 1] = block
+        arr.flush()
+        del arr
+        tmp.replace(out_dir / f"{v}.npy")
+
+    write_json_atomic(out_dir / "meta.json", {
+        "latitude": [float(x) for x in latitude],
+        "longitude": [float(x) for x in longitude],
+        "doys": [int(d) for d in doys],
+        "grid_key": grid_key(clim["latitude"].values, clim["longitude"].values, latitude, longitude),
+        "source": source or {},
+    })
+
+
+class GridClimatology:
+    """Read-only view of a forecast-grid climatology store (memory-mapped)."""
+
+    def __init__(self, store_dir):
+        self.store_dir = Path(store_dir)
+        self.meta = read_json(self.store_dir / "meta.json")
+        if self.meta is None:
+            raise FileNotFoundError(f"No climatology store at {self.store_dir}")
+        self.latitude = np.asarray(self.meta["latitude"])
+        self.longitude = np.asarray(self.meta["longitude"])
+        self.doys = set(self.meta["doys"])
+        self.arrays = {v: np.load(self.store_dir / f"{v}.npy", mmap_mode="r") for v in VARS}
+
+    def is_current(self, clim_nc) -> bool:
+        """True if the store was built from clim_nc as it is now (size/mtime check)."""
+        src = self.meta.get("source", {})
+        st = Path(clim_nc).stat()
+        return src.get("size") == st.st_size and src.get("mtime_ns") == st.st_mtime_ns
+
+    def matches(self, latitude, longitude) -> bool:
+        lat, lon = np.asarray(latitude), np.asarray(longitude)
+        return (lat.shape == self.latitude.shape and lon.shape == self.longitude.shape
+                and np.allclose(lat, self.latitude) and np.allclose(lon, self.longitude))
+
+    def day(self, doy: int, variables=VARS) -> xr.Dataset:
+        """Climatology for one day-of-year on the forecast grid (one slice per var)."""
+        if doy not in self.doys:
+            raise KeyError(f"doy {doy} not in climatology store {self.store_dir}")
+        return xr.Dataset(
+            {v: (("latitude", "longitude"), np.array(self.arrays[v][doy - 1])) for v in variables},
+            coords={"latitude": self.latitude, "longitude": self.longitude},
+        )
+
+
+def open_store(store_dir, clim_nc, latitude, longitude) -> GridClimatology | None:
+    """The store if it exists, is current for clim_nc and matches the grid; else None."""
+    try:
+        store = GridClimatology(store_dir)
+    except FileNotFoundError:
+        return None
+    if not store.is_current(clim_nc) or not store.matches(latitude, longitude):
+        print(f"Climatology store {store_dir} is stale or on another grid; interpolating instead.")
+        return None
+    return store
+
+
+class StoreCache:
+    """
+    open_store() memoized per forecast grid, for long-lived processes that
+    score many subsets (serve.py, backfill_gfs_features.py). Thread-safe; a
+    grid without a usable store is remembered as None.
+    """
+
+    def __init__(self, store_dir, clim_nc, clim: xr.Dataset):
+        self.store_dir = store_dir
+        self.clim_nc = clim_nc
+        self.clim_lat = clim["latitude"].values
+        self.clim_lon = clim["longitude"].values
+        self.lock = threading.Lock()
+        self.stores = {}  # grid key -> GridClimatology | None
+
+    def get(self, latitude, longitude) -> GridClimatology | None:
+        key = grid_key(self.clim_lat, self.clim_lon, np.asarray(latitude), np.asarray(longitude))
+        with self.lock:
+            if key not in self.stores:
+                self.stores[key] = open_store(self.store_dir, self.clim_nc, latitude, longitude)
+            return self.stores[key]
+
+
+def climatology_on_grid(doy: int, latitude, longitude, clim: xr.Dataset,
+                        store: GridClimatology | None = None, variables=VARS,
+                        cache_dir: Path | None = DEFAULT_CACHE_DIR) -> xr.Dataset:
+    """
+    Climatology for one doy on the forecast grid: a slice of the precomputed
+    store when it matches the grid, otherwise regridded from clim.
+    """
+    if store is not None and store.matches(latitude, longitude):
+        out = store.day(doy, variables)
+        return out.assign_coords(latitude=np.asarray(latitude), longitude=np.asarray(longitude))
+    return regrid(clim[list(variables)].sel(doy=doy), latitude, longitude, cache_dir=cache_dir)
+
+
+def main():
+    args = parse_args()
+    clim = xr.open_dataset(args.clim_nc).load()
+
+    if args.grid_nc:
+        with xr.open_dataset(args.grid_nc) as g:
+            lat, lon = g["latitude"].values, g["longitude"].values
+    else:
+        lat, lon = gfs_grid(args.south, args.north, args.west, args.east, args.res)
+
+    fp = file_fingerprint(Path(args.clim_nc))
+    build_store(clim, lat, lon, Path(args.out_dir), source={"path": str(args.clim_nc), **fp})
+    print(f"Saved forecast-grid climatology ({len(lat)}x{len(lon)}) to {Path(args.out_dir).resolve()}")
+
+
+if __name__ == "__main__":
+    main()
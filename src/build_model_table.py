@@ -1,26 +1,24 @@
 from __future__ import annotations
 import argparse
-from pathlib import Path
-import pandas as pd
+
+from storage import read_table, write_table
 
 def parse_args():
     p = argparse.ArgumentParser()
-    p.add_argument("--features", type=str, default="data/processed/era5_features.csv")
-    p.add_argument("--prices", type=str, default="data/processed/prices.csv")
-    p.add_argument("--out", type=str, default="data/processed/model_table.csv")
+    p.add_argument("--features", type=str, default="data/processed/era5_features.parquet")
+    p.add_argument("--prices", type=str, default="data/processed/prices.parquet")
+    p.add_argument("--out", type=str, default="data/processed/model_table.parquet")
     return p.parse_args()
 
 def main():
     args = parse_args()
-    feat = pd.read_csv(args.features, parse_dates=["date"])
-    px = pd.read_csv(args.prices, parse_dates=["date"])
+    feat = read_table(args.features, "era5_features")
+    px = read_table(args.prices, "prices", columns=["date", "target_next_absret"])
 
-    df = feat.merge(px[["date", "target_next_absret"]], on="date", how="inner")
+    df = feat.merge(px, on="date", how="inner")
     df = df.dropna(subset=["target_next_absret"])
 
-    out = Path(args.out)
-    out.parent.mkdir(parents=True, exist_ok=True)
-    df.to_csv(out, index=False)
+    out = write_table(df, args.out, "model_table")
     print(f"Saved model table to {out.resolve()} (rows={len(df)})")
 
 if __name__ == "__main__":
@@ -0,0 +1,105 @@
+# src/check_precision_drift.py
+"""
+Drift check for the precision policy (precision.py).
+
+Runs anomalies -> features on one GFS subset twice: in float64 with the
+inputs as read, and with the subset, the climatology and the anomalies each
+written and re-read under the policy (float32 compute, packing, compression)
+the way the pipeline stores them. Prints the largest change per feature and
+the on-disk / in-memory sizes, and exits with status 1 if any feature moves
+by more than its tolerance.
+
+    python src/check_precision_drift.py --policy int16
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+import precision
+from compute_forecast_anomalies import compute_anomalies
+from extract_forecast_features import extract_features
+from features import FEATURE_COLS
+
+# Max abs change per feature: °C / m s⁻¹ / degree-days, and area fractions
+# (one grid cell of a ~50x60 subset is ~0.0004)
+DEFAULT_TOL = {c: 0.01 for c in FEATURE_COLS} | {"hot_area_frac": 0.005, "cold_area_frac": 0.005}
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Check features under a precision policy against float64.")
+    p.add_argument("--forecast_nc", type=str, default="data/processed/gfs_subset.nc")
+    p.add_argument("--clim_nc", type=str, default="data/processed/climatology_doy.nc")
+    p.add_argument("--policy", type=str, choices=precision.POLICIES, default=precision.DEFAULT_POLICY)
+    p.add_argument("--atol", type=float, default=None, help="One tolerance for every feature (overrides defaults).")
+    return p.parse_args()
+
+
+def roundtrip(ds: xr.Dataset, policy: str, path: Path) -> tuple[xr.Dataset, int]:
+    """ds written under the policy and read back (loaded), plus the file size."""
+    precision.to_netcdf(ds, path, policy)
+    with xr.open_dataset(path) as out:
+        return out.load(), path.stat().st_size
+
+
+def drift_table(ref: pd.DataFrame, new: pd.DataFrame, tol: dict[str, float]) -> pd.DataFrame:
+    rows = []
+    for c in FEATURE_COLS:
+        d = np.abs(new[c].to_numpy() - ref[c].to_numpy())
+        rows.append({"feature": c, "max_abs_diff": float(np.nanmax(d)) if d.size else 0.0, "tol": tol[c]})
+    out = pd.DataFrame(rows)
+    out["ok"] = out["max_abs_diff"] <= out["tol"]
+    return out
+
+
+def main():
+    args = parse_args()
+    tol = {c: args.atol for c in FEATURE_COLS} if args.atol is not None else DEFAULT_TOL
+
+    with xr.open_dataset(args.forecast_nc) as ds:
+        fc = ds.load()
+    with xr.open_dataset(args.clim_nc) as ds:
+        clim = ds.load()
+
+    # Reference: float64 all the way, nothing written
+    fc64, clim64 = precision.as_compute(fc, "float64"), precision.as_compute(clim, "float64")
+    anoms64 = compute_anomalies(fc64, clim64, policy="float64")
+    ref = extract_features(anoms64, clim64)
+
+    sizes = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        for name, ds in [("gfs_subset", fc64), ("climatology", clim64), ("anomalies", anoms64)]:
+            sizes[name] = [roundtrip(ds, "float64", tmp / f"{name}_64.nc")[1]]
+
+        fc_p, n = roundtrip(precision.as_compute(fc, args.policy), args.policy, tmp / "fc.nc")
+        sizes["gfs_subset"].append(n)
+        clim_p, n = roundtrip(precision.as_compute(clim, args.policy), args.policy, tmp / "clim.nc")
+        sizes["climatology"].append(n)
+        anoms_p, n = roundtrip(compute_anomalies(fc_p, clim_p, policy=args.policy), args.policy, tmp / "anoms.nc")
+        sizes["anomalies"].append(n)
+        new = extract_features(anoms_p, clim_p)
+
+    print(f"Policy '{args.policy}' vs float64 ({len(ref)} feature row(s))\n")
+    print(f"{'file':<12} {'float64 MB':>11} {args.policy + ' MB':>11} {'ratio':>6}")
+    for name, (a, b) in sizes.items():
+        print(f"{name:<12} {a / 1e6:11.3f} {b / 1e6:11.3f} {a / max(b, 1):6.1f}x")
+    print(f"anomalies in memory: {anoms64.nbytes / 1e6:.3f} MB float64 -> {anoms_p.nbytes / 1e6:.3f} MB\n")
+
+    table = drift_table(ref, new, tol)
+    print(table.to_string(index=False, float_format=lambda x: f"{x:.2e}"))
+    bad = table[~table["ok"]]
+    if len(bad):
+        print(f"\nDrift over tolerance: {', '.join(bad['feature'])}")
+        sys.exit(1)
+    print("\nAll features within tolerance.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# src/cli.py
+"""
+Single entry point for the pipeline scripts (run via src/__main__.py):
+
+    python -m src <command> [args...]
+    python -m src --help
+
+Each command is a script module in src/ that is imported only when it runs,
+so xarray/sklearn/matplotlib are loaded only by the commands that use them.
+Keep this module stdlib-only: `python -m src latest` should start instantly.
+"""
+from __future__ import annotations
+
+import importlib
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent
+
+# command -> (module in src/, description)
+COMMANDS = {
+    "download-era5": ("download_era5_hourly_region_monthly", "Download ERA5 hourly months from CDS"),
+    "era5-zarr": ("era5_zarr", "Consolidate ERA5 monthly files into chunked Zarr archives"),
+    "climatology": ("build_climatology_era5", "Build the day-of-year ERA5 climatology"),
+    "fc-climatology": ("build_forecast_climatology", "Precompute the climatology on the forecast grid"),
+    "era5-features": ("build_era5_feature_table", "Build the daily ERA5 feature table"),
+    "prices": ("get_prices", "Download prices and next-day abs-return target"),
+    "model-table": ("build_model_table", "Join ERA5 features with the target"),
+    "train": ("train", "Fit the model and save the bundle"),
+    "backtest": ("backtest", "Walk-forward backtest"),
+    "gfs": ("get_gfs_forecast", "Download a GFS regional subset"),
+    "anomalies": ("compute_forecast_anomalies", "Forecast minus climatology"),
+    "map": ("make_anomaly_map", "Plot the anomaly map"),
+    "features": ("extract_forecast_features", "Regional features from forecast anomalies"),
+    "gfs-backfill": ("backfill_gfs_features", "Backfill GFS forecast features over historical cycles"),
+    "predict": ("predict", "Predict next-day abs move and regime"),
+    "forecast": ("run_forecast", "End-to-end forecast run"),
+    "serve": ("serve", "Resident prediction service"),
+    "precision-drift": ("check_precision_drift", "Check features under the grid precision policy vs float64"),
+    "dataset": ("build_dataset", "Build the placeholder demand modeling table"),
+    "evaluate": ("evaluate", "Score the placeholder demand model and plot actual vs predicted"),
+    "latest": (None, "Print the latest forecast summary"),
+    "bench-startup": ("bench_startup", "Measure startup/import time of every command"),
+}
+
+
+def usage() -> str:
+    width = max(len(c) for c in COMMANDS)
+    lines = ["usage: python -m src <command> [args...]", "", "commands:"]
+    lines += [f"  {c:<{width}}  {desc}" for c, (_, desc) in COMMANDS.items()]
+    lines += ["", "Run `python -m src <command> --help` for the command's options."]
+    return "\n".join(lines)
+
+
+def latest(argv: list[str]) -> int:
+    from config import OUTPUTS_DIR
+
+    path = OUTPUTS_DIR / ("volatility_forecast.csv" if "--csv" in argv else "summary.txt")
+    if not path.exists():
+        print(f"No forecast yet ({path} missing). Run `python -m src forecast`.", file=sys.stderr)
+        return 1
+    print(path.read_text(encoding="utf-8"))
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return 0
+
+    cmd, rest = argv[0], argv[1:]
+    if cmd not in COMMANDS:
+        print(f"Unknown command '{cmd}'.\n\n{usage()}", file=sys.stderr)
+        return 2
+
+    if cmd == "latest":
+        return latest(rest)
+
+    module = importlib.import_module(COMMANDS[cmd][0])
+    sys.argv = [f"python -m src {cmd}", *rest]
+    module.main()
+    return 0
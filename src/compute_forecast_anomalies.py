@@ -1,14 +1,24 @@
 # src/compute_forecast_anomalies.py
 from __future__ import annotations
 import argparse
+from pathlib import Path
+import numpy as np
 import xarray as xr
 
+from build_forecast_climatology import DEFAULT_STORE, GridClimatology, climatology_on_grid, open_store
+import precision
+from regrid import DEFAULT_CACHE_DIR
+
 
 def parse_args():
     p = argparse.ArgumentParser()
     p.add_argument("--forecast_nc", type=str, default="data/processed/gfs_subset.nc")
     p.add_argument("--clim_nc", type=str, default="data/processed/climatology_doy.nc")
     p.add_argument("--out", type=str, default="data/processed/forecast_anoms.nc")
+    p.add_argument("--regrid_cache", type=str, default=str(DEFAULT_CACHE_DIR))
+    p.add_argument("--clim_store", type=str, default=DEFAULT_STORE,
+                   help="Forecast-grid climatology from build_forecast_climatology.py (used if current).")
+    p.add_argument("--precision", type=str, choices=precision.POLICIES, default=precision.DEFAULT_POLICY)
     return p.parse_args()
 
 
@@ -19,35 +29,43 @@ def pick_var(ds: xr.Dataset, contains: str) -> str:
     raise KeyError(f"Could not find var containing '{contains}'. Vars: {list(ds.data_vars)}")
 
 
-def main():
-    args = parse_args()
-    fc = xr.open_dataset(args.forecast_nc)
-    clim = xr.open_dataset(args.clim_nc)
-
-    # Forecast valid time
+def compute_anomalies(fc: xr.Dataset, clim: xr.Dataset,
+                      cache_dir: Path | None = DEFAULT_CACHE_DIR,
+                      clim_store: GridClimatology | None = None,
+                      policy: str = precision.DEFAULT_POLICY) -> xr.Dataset:
+    """
+    Forecast minus day-of-year climatology (regridded to the forecast grid).
+    Works for one lead or many stacked along a dim (e.g. 'step' from
+    get_gfs_forecast.py --fxx_range), with the climatology matched per valid day.
+    Computed in the precision policy's dtype.
+    """
+    # Forecast valid time (scalar, or one per lead)
     valid_time = fc["valid_time"] if "valid_time" in fc.coords else fc["time"]
-    doy = int(valid_time.dt.dayofyear.values)
+    doys = np.atleast_1d(valid_time.dt.dayofyear.values)
 
     # Forecast vars (should be t2m/u10/v10 if you used the fixed get_gfs_forecast.py)
     tvar = "t2m" if "t2m" in fc.data_vars else pick_var(fc, "t2m")
     uvar = "u10" if "u10" in fc.data_vars else pick_var(fc, "u10")
     vvar = "v10" if "v10" in fc.data_vars else pick_var(fc, "v10")
 
+    fc = precision.as_compute(fc[[tvar, uvar, vvar]], policy)
     T = fc[tvar]
     if float(T.max()) > 200:
         T = T - 273.15
 
-    # Select the climatology for this day-of-year
-    Tc = clim["t2m"].sel(doy=doy)
-    Uc = clim["u10"].sel(doy=doy)
-    Vc = clim["v10"].sel(doy=doy)
+    # Climatology for this day-of-year on the forecast grid (lat/lon): a slice
+    # of the precomputed store, else cached bilinear weights (one sparse matmul)
+    per_doy = {int(d): climatology_on_grid(int(d), fc["latitude"], fc["longitude"], clim,
+                                           store=clim_store, cache_dir=cache_dir)
+               for d in np.unique(doys)}
+    if valid_time.ndim == 0:
+        clim_i = per_doy[int(doys[0])]
+    else:
+        clim_i = xr.concat([per_doy[int(d)] for d in doys], dim=valid_time.dims[0])
+    clim_i = precision.as_compute(clim_i[["t2m", "u10", "v10"]], policy)
+    Tc_i, Uc_i, Vc_i = clim_i["t2m"], clim_i["u10"], clim_i["v10"]
 
-    # Regrid climatology to forecast grid (lat/lon)
-    Tc_i = Tc.interp(latitude=fc["latitude"], longitude=fc["longitude"])
-    Uc_i = Uc.interp(latitude=fc["latitude"], longitude=fc["longitude"])
-    Vc_i = Vc.interp(latitude=fc["latitude"], longitude=fc["longitude"])
-
-    out = xr.Dataset(
+    return xr.Dataset(
         {
             "t2m_anom_c": (T - Tc_i),
             "u10_anom": (fc[uvar] - Uc_i),
@@ -55,7 +73,18 @@ def main():
         }
     )
 
-    out.to_netcdf(args.out)
+
+def main():
+    args = parse_args()
+    fc = xr.open_dataset(args.forecast_nc)
+    clim = xr.open_dataset(args.clim_nc)
+
+    store = open_store(args.clim_store, args.clim_nc, fc["latitude"], fc["longitude"])
+
+    out = compute_anomalies(fc, clim, cache_dir=Path(args.regrid_cache), clim_store=store,
+                            policy=args.precision)
+
+    precision.to_netcdf(out, args.out, args.precision)
     print(f"Saved anomalies to {args.out}")
 
 
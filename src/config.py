@@ -9,8 +9,11 @@ PROCESSED_DIR = DATA_DIR / "processed"
 MODELS_DIR = PROJECT_ROOT / "models"
 OUTPUTS_DIR = PROJECT_ROOT / "outputs"
 REPORTS_DIR = PROJECT_ROOT / "reports"
+FIGURES_DIR = REPORTS_DIR / "figures"
 
-PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
-MODELS_DIR.mkdir(parents=True, exist_ok=True)
-OUTPUTS_DIR.mkdir(parents=True, exist_ok=True)
-(REPORTS_DIR / "figures").mkdir(parents=True, exist_ok=True)
+
+def ensure_parent(path) -> Path:
+    """Create the parent directory of path (on first write, not at import) and return path."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path
@@ -2,8 +2,20 @@
 from __future__ import annotations
 
 import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-import cdsapi
+from typing import Callable
+
+from utils import read_json, write_json_atomic
+
+DATASET = "reanalysis-era5-single-levels"
+DEFAULT_OUT_DIR = "data/raw/era5_hourly_monthly"
+# N/W/S/E of the original ERCOT box; manifest entries written before areas
+# were recorded are assumed to be for this area
+DEFAULT_AREA = [37.0, -107.0, 25.0, -93.0]
 
 
 def parse_args():
@@ -14,21 +26,64 @@ def parse_args():
     p.add_argument("--north", type=float, default=37.0)
     p.add_argument("--west", type=float, default=-107.0)
     p.add_argument("--east", type=float, default=-93.0)
+    p.add_argument("--regions", type=str, nargs="+", default=None,
+                   help="Download one domain covering these regions (names, 'all' or a .json); overrides the box.")
     p.add_argument("--times", nargs="+", default=["00:00", "06:00", "12:00", "18:00"])
-    p.add_argument("--out_dir", type=str, default="data/raw/era5_hourly_monthly")
+    p.add_argument("--out_dir", type=str, default=None,
+                   help=f"Default: {DEFAULT_OUT_DIR}, or {DEFAULT_OUT_DIR}_<area> for any other area.")
+    p.add_argument("--workers", type=int, default=4,
+                   help="Number of CDS requests kept in flight at once.")
+    p.add_argument("--manifest", type=str, default=None,
+                   help="Job manifest JSON. Default: <out_dir>/manifest.json")
     p.add_argument("--test_one", action="store_true",
                    help="Download just one month (1994-01) to test setup quickly.")
     return p.parse_args()
 
 
-def main():
-    args = parse_args()
-    out_dir = Path(args.out_dir)
-    out_dir.mkdir(parents=True, exist_ok=True)
+class Manifest:
+    """
+    Thread-safe job manifest: one entry per target file with its state
+    (queued/running/done/failed), byte count, timings and last error.
+    Saved atomically after every change so a crash never leaves it half-written.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.jobs: dict[str, dict] = read_json(self.path, default={})
+
+    def get(self, name: str) -> dict:
+        with self._lock:
+            return dict(self.jobs.get(name, {}))
+
+    def update(self, name: str, **fields) -> None:
+        with self._lock:
+            self.jobs.setdefault(name, {}).update(fields)
+            write_json_atomic(self.path, self.jobs)
+
+    def update_many(self, updates: dict[str, dict]) -> None:
+        """Apply several entries' updates with a single save."""
+        with self._lock:
+            for name, fields in updates.items():
+                self.jobs.setdefault(name, {}).update(fields)
+            write_json_atomic(self.path, self.jobs)
+
 
-    c = cdsapi.Client()
+def area_of(args) -> list[float]:
+    return [float(args.north), float(args.west), float(args.south), float(args.east)]
 
-    area = [args.north, args.west, args.south, args.east]
+
+def default_out_dir(area: list[float]) -> str:
+    """Months of different areas never share a directory unless --out_dir says so."""
+    if area == DEFAULT_AREA:
+        return DEFAULT_OUT_DIR
+    return DEFAULT_OUT_DIR + "_" + "_".join(f"{k}{v:g}" for k, v in zip("nwse", area))
+
+
+def build_jobs(args) -> list[tuple[Path, dict]]:
+    """(target file, CDS request) for every month in the requested range."""
+    out_dir = Path(args.out_dir)
+    area = area_of(args)
     days = [f"{d:02d}" for d in range(1, 32)]
 
     years = [args.start_year]
@@ -37,14 +92,10 @@ def main():
         years = list(range(args.start_year, args.end_year + 1))
         months = list(range(1, 13))
 
+    jobs = []
     for year in years:
         for month in months:
             m = f"{month:02d}"
-            target = out_dir / f"era5_{year}_{m}.nc"
-            if target.exists() and target.stat().st_size > 0:
-                print(f"Skip existing: {target} ({target.stat().st_size/1e6:.1f} MB)")
-                continue
-
             req = {
                 "product_type": "reanalysis",
                 "format": "netcdf",
@@ -59,22 +110,127 @@ def main():
                 "time": args.times,
                 "area": area,
             }
+            jobs.append((out_dir / f"era5_{year}_{m}.nc", req))
+    return jobs
+
+
+def is_done(target: Path, manifest: Manifest, area: list[float]) -> bool:
+    """
+    A target counts as done if the manifest says so for the same area and the
+    file size matches. Non-empty files from before the manifest existed are
+    adopted as done only for the default area (the one they were downloaded for).
+    """
+    if not target.exists() or target.stat().st_size == 0:
+        return False
+    entry = manifest.get(target.name)
+    size = target.stat().st_size
+    if not entry:
+        if area != DEFAULT_AREA:
+            return False
+        manifest.update(target.name, state="done", bytes=size, area=area, adopted=True)
+        return True
+    return (entry.get("state") == "done" and entry.get("bytes") == size
+            and entry.get("area", DEFAULT_AREA) == area)
+
+
+def _default_client():
+    import cdsapi
+
+    return cdsapi.Client()
+
+
+def download_one(target: Path, req: dict, client, manifest: Manifest) -> int:
+    """Retrieve one month into a temp file, then rename it into place."""
+    part = target.with_name(target.name + ".part")
+    part.unlink(missing_ok=True)
+    manifest.update(target.name, state="running", started=time.time(), error=None)
+    print(f"Requesting ERA5 {req['year']}-{req['month']} -> {target}")
+
+    result = client.retrieve(DATASET, req, str(part))
+
+    if not part.exists() or part.stat().st_size == 0:
+        raise RuntimeError(f"Download did not create a valid file: {part} (CDS response: {result})")
+
+    size = part.stat().st_size
+    os.replace(part, target)
+    manifest.update(target.name, state="done", bytes=size, area=req["area"], finished=time.time())
+    print(f"Downloaded OK: {target} ({size/1e6:.1f} MB)")
+    return size
+
+
+def run_downloads(
+    jobs: list[tuple[Path, dict]],
+    manifest: Manifest,
+    client_factory: Callable = _default_client,
+    workers: int = 4,
+) -> dict[str, int]:
+    """
+    Run jobs on a bounded thread pool. Each worker thread gets its own client
+    from client_factory, so a fake CDS can be plugged in for testing.
+    Returns counts of done/skipped/failed jobs.
+    """
+    local = threading.local()
+
+    def client():
+        if not hasattr(local, "client"):
+            local.client = client_factory()
+        return local.client
+
+    def work(target: Path, req: dict) -> int:
+        try:
+            return download_one(target, req, client(), manifest)
+        except Exception as e:
+            manifest.update(target.name, state="failed", error=repr(e), finished=time.time())
+            raise
+
+    todo = []
+    skipped = 0
+    for target, req in jobs:
+        if is_done(target, manifest, req["area"]):
+            print(f"Skip existing: {target} ({target.stat().st_size/1e6:.1f} MB)")
+            skipped += 1
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        manifest.update(target.name, state="queued", year=req["year"], month=req["month"], area=req["area"])
+        todo.append((target, req))
+
+    done = failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(work, t, r): t for t, r in todo}
+        for fut in as_completed(futures):
+            try:
+                fut.result()
+                done += 1
+            except Exception as e:
+                failed += 1
+                print(f"FAILED: {futures[fut]}: {e}")
+
+    return {"done": done, "skipped": skipped, "failed": failed}
 
-            print(f"\nRequesting ERA5 {year}-{m}")
-            print(f"Area N/W/S/E: {area}")
-            print(f"Times: {args.times}")
-            print(f"Saving to: {target}")
 
-            result = c.retrieve("reanalysis-era5-single-levels", req, str(target))
-            # result may be a dict-like object; print something helpful
-            print("CDS response:", result)
+def main():
+    args = parse_args()
+    if args.regions:
+        from regions import domain_box, resolve_regions
+
+        for k, v in domain_box(resolve_regions(args.regions)).items():
+            setattr(args, k, v)
+    out_dir = Path(args.out_dir or default_out_dir(area_of(args)))
+    args.out_dir = str(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    manifest = Manifest(Path(args.manifest) if args.manifest else out_dir / "manifest.json")
+    jobs = build_jobs(args)
 
-            if not target.exists() or target.stat().st_size == 0:
-                raise RuntimeError(f"Download did not create a valid file: {target}")
+    print(f"Area N/W/S/E: {area_of(args)} -> {out_dir}")
+    print(f"Times: {args.times}")
+    print(f"Jobs: {len(jobs)} months, {args.workers} workers")
 
-            print(f"Downloaded OK: {target} ({target.stat().st_size/1e6:.1f} MB)")
+    counts = run_downloads(jobs, manifest, workers=args.workers)
 
-    print("\nDone.")
+    print(f"\nDone. downloaded={counts['done']} skipped={counts['skipped']} failed={counts['failed']}")
+    if counts["failed"]:
+        raise SystemExit(f"{counts['failed']} month(s) failed; see {manifest.path}. Re-run to retry.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,112 @@
+# src/doy_accumulator.py
+"""
+Per-day-of-year running statistics (count, mean, M2) for gridded daily data.
+
+Partial accumulators are built independently (e.g. one per monthly file in a
+process pool) and merged with Chan's parallel update of Welford's algorithm,
+so the result does not depend on how the data was split. The merged state is
+saved to disk so new months can be folded in later without re-reading history.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import xarray as xr
+
+NDOY = 366
+
+
+class DoyAccumulator:
+    def __init__(self, variables: list[str], latitude: np.ndarray, longitude: np.ndarray):
+        self.variables = list(variables)
+        self.latitude = np.asarray(latitude)
+        self.longitude = np.asarray(longitude)
+        shape = (NDOY, len(self.latitude), len(self.longitude))
+        self.n = {v: np.zeros(shape, dtype=np.int64) for v in self.variables}
+        self.mean = {v: np.zeros(shape) for v in self.variables}
+        self.m2 = {v: np.zeros(shape) for v in self.variables}
+
+    def _merge_rows(self, v: str, rows: np.ndarray, nb, mb, m2b) -> None:
+        na, ma, m2a = self.n[v][rows], self.mean[v][rows], self.m2[v][rows]
+        n = na + nb
+        with np.errstate(invalid="ignore", divide="ignore"):
+            delta = mb - ma
+            frac = np.where(n > 0, nb / n, 0.0)
+            self.mean[v][rows] = np.where(nb > 0, ma + delta * frac, ma)
+            self.m2[v][rows] = np.where(nb > 0, m2a + m2b + delta**2 * na * frac, m2a)
+        self.n[v][rows] = n
+
+    def add_daily(self, day: xr.Dataset) -> None:
+        """Fold in daily fields with dims (time, latitude, longitude)."""
+        day = day.transpose("time", "latitude", "longitude")
+        idx = day["time"].dt.dayofyear.values - 1
+        rows, inv = np.unique(idx, return_inverse=True)
+        shape = (len(rows), len(self.latitude), len(self.longitude))
+
+        for v in self.variables:
+            x = day[v].values.astype(np.float64)
+            ok = ~np.isnan(x)
+            nb = np.zeros(shape, dtype=np.int64)
+            s = np.zeros(shape)
+            np.add.at(nb, inv, ok)
+            np.add.at(s, inv, np.where(ok, x, 0.0))
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mb = np.where(nb > 0, s / nb, 0.0)
+            dev = np.where(ok, x - mb[inv], 0.0)
+            m2b = np.zeros(shape)
+            np.add.at(m2b, inv, dev**2)
+            self._merge_rows(v, rows, nb, mb, m2b)
+
+    def partial(self) -> dict:
+        """Compact copy holding only the doys with data (cheap to send between processes)."""
+        rows = np.flatnonzero(self.n[self.variables[0]].reshape(NDOY, -1).any(axis=1))
+        return {
+            "latitude": self.latitude, "longitude": self.longitude, "rows": rows,
+            "stats": {v: (self.n[v][rows], self.mean[v][rows], self.m2[v][rows]) for v in self.variables},
+        }
+
+    def merge(self, other: "DoyAccumulator | dict") -> "DoyAccumulator":
+        p = other.partial() if isinstance(other, DoyAccumulator) else other
+        if not (np.allclose(self.latitude, p["latitude"]) and np.allclose(self.longitude, p["longitude"])):
+            raise ValueError("Cannot merge accumulators on different grids.")
+        for v in self.variables:
+            self._merge_rows(v, p["rows"], *p["stats"][v])
+        return self
+
+    def to_dataset(self, dtype=np.float64) -> xr.Dataset:
+        """Mean and sample std (ddof=1) for every doy that has data."""
+        seen = np.flatnonzero(self.n[self.variables[0]].reshape(NDOY, -1).any(axis=1))
+        dims = ("doy", "latitude", "longitude")
+        data = {}
+        with np.errstate(invalid="ignore", divide="ignore"):
+            for v in self.variables:
+                n = self.n[v][seen]
+                data[v] = (dims, np.where(n > 0, self.mean[v][seen], np.nan).astype(dtype))
+                std = np.where(n > 1, np.sqrt(self.m2[v][seen] / (n - 1)), np.nan)
+                data[f"{v}_std"] = (dims, std.astype(dtype))
+        return xr.Dataset(data, coords={"doy": seen + 1, "latitude": self.latitude,
+                                        "longitude": self.longitude})
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        arrays = {"latitude": self.latitude, "longitude": self.longitude,
+                  "variables": np.array(self.variables)}
+        for v in self.variables:
+            arrays[f"{v}__n"] = self.n[v]
+            arrays[f"{v}__mean"] = self.mean[v]
+            arrays[f"{v}__m2"] = self.m2[v]
+        tmp = path.with_name(path.stem + ".tmp.npz")
+        np.savez_compressed(tmp, **arrays)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "DoyAccumulator":
+        z = np.load(path)
+        acc = cls([str(v) for v in z["variables"]], z["latitude"], z["longitude"])
+        for v in acc.variables:
+            acc.n[v] = z[f"{v}__n"]
+            acc.mean[v] = z[f"{v}__mean"]
+            acc.m2[v] = z[f"{v}__m2"]
+        return acc
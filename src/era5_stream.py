@@ -0,0 +1,134 @@
+# src/era5_stream.py
+"""
+Bounded-memory iteration over ERA5 hourly monthly files.
+
+Files (or time ranges of the era5_zarr archive) are opened one at a time and
+cut into windows of whole days; each window is loaded, handed to the caller,
+and released before the next one is read. With a memory limit, the window
+length is sized from the limit and halved whenever the measured RSS goes
+over it.
+"""
+from __future__ import annotations
+
+import gc
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from precision import as_compute
+from utils import current_rss_bytes
+
+REQUIRED = ["t2m", "u10", "v10"]
+
+# Rough peak-memory multiple of one loaded window (hourly + daily + kernel blocks)
+WINDOW_OVERHEAD = 4
+
+
+def normalize_varnames(ds: xr.Dataset) -> xr.Dataset:
+    # Try common ERA5 variable naming; adjust here if yours differs.
+    rename = {}
+    for v in list(ds.data_vars):
+        lv = v.lower()
+        if lv in ["t2m", "2t"] and "t2m" not in ds.data_vars:
+            rename[v] = "t2m"
+        if lv in ["u10", "10u"] and "u10" not in ds.data_vars:
+            rename[v] = "u10"
+        if lv in ["v10", "10v"] and "v10" not in ds.data_vars:
+            rename[v] = "v10"
+    if rename:
+        ds = ds.rename(rename)
+    # Packed ERA5 files can decode to float64; compute in the policy dtype
+    ds = as_compute(ds)
+
+    # Kelvin -> Celsius for t2m
+    if "t2m" in ds and float(ds["t2m"].max()) > 200:
+        ds["t2m"] = ds["t2m"] - 273.15
+
+    return ds
+
+
+def normalize_time(ds: xr.Dataset) -> xr.Dataset:
+    # Some datasets use valid_time instead of time
+    if "time" not in ds.dims:
+        if "valid_time" in ds.dims:
+            ds = ds.rename({"valid_time": "time"})
+        elif "valid_time" in ds.coords:
+            ds = ds.set_coords("valid_time").rename({"valid_time": "time"})
+    return ds
+
+
+def open_month(path: Path) -> xr.Dataset:
+    """Lazily open one monthly file with a 'time' dimension."""
+    return normalize_time(xr.open_dataset(path))
+
+
+def window_days_for_limit(ds: xr.Dataset, max_rss_gb: float) -> int:
+    """Days per window so that one loaded window stays well inside the limit."""
+    days = pd.to_datetime(ds["time"].values).normalize()
+    steps_per_day = max(1, int(np.ceil(len(days) / max(1, days.nunique()))))
+    da = ds[list(ds.data_vars)[0]]
+    ncell = int(np.prod([ds.sizes[d] for d in da.dims if d != "time"]))
+    bytes_per_day = steps_per_day * ncell * len(REQUIRED) * 8 * WINDOW_OVERHEAD
+
+    baseline = current_rss_bytes() or 0
+    budget = max_rss_gb * 1e9 - baseline
+    return max(1, int(budget // bytes_per_day))
+
+
+def _windows(ds: xr.Dataset, window_days: int | None, max_rss_gb: float | None,
+             label: str) -> Iterator[xr.Dataset]:
+    limit = max_rss_gb * 1e9 if max_rss_gb else None
+    days = pd.to_datetime(ds["time"].values).normalize()
+    unique_days = days.unique()
+
+    n = window_days or len(unique_days)
+    if limit:
+        n = min(n, window_days_for_limit(ds, max_rss_gb))
+
+    i = 0
+    while i < len(unique_days):
+        sel = np.flatnonzero(days.isin(unique_days[i:i + n]))
+        win = normalize_varnames(ds.isel(time=sel).load())
+        missing = [v for v in REQUIRED if v not in win.data_vars]
+        if missing:
+            raise SystemExit(f"Missing vars in {label}: {missing}. Found: {list(win.data_vars)}")
+        yield win[REQUIRED]
+        i += n
+
+        del win
+        gc.collect()
+        rss = current_rss_bytes()
+        if limit and rss and rss > limit and n > 1:
+            n = max(1, n // 2)
+            print(f"RSS {rss/1e9:.2f} GB over limit; window reduced to {n} day(s)")
+
+
+def iter_hourly_windows(
+    files: list[Path],
+    window_days: int | None = None,
+    max_rss_gb: float | None = None,
+) -> Iterator[xr.Dataset]:
+    """
+    Yield loaded hourly windows (t2m in °C, u10, v10) one at a time.
+
+    window_days=None keeps one window per file unless max_rss_gb forces smaller
+    windows. Windows never split a day, so each daily mean is complete as long
+    as a day is not split across files.
+    """
+    for f in files:
+        with open_month(f) as ds:
+            yield from _windows(ds, window_days, max_rss_gb, f.name)
+
+
+def iter_archive_windows(
+    ds: xr.Dataset,
+    start,
+    end,
+    window_days: int | None = None,
+    max_rss_gb: float | None = None,
+) -> Iterator[xr.Dataset]:
+    """iter_hourly_windows() for the time range [start, end] of an opened era5_zarr archive."""
+    yield from _windows(ds.sel(time=slice(start, end)), window_days, max_rss_gb, f"archive {start}..{end}")
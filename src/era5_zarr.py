@@ -0,0 +1,186 @@
+# src/era5_zarr.py
+"""
+Chunked Zarr archive of the ERA5 hourly monthly downloads.
+
+    python src/era5_zarr.py --hourly_dir data/raw/era5_hourly_monthly
+
+Consolidates the monthly NetCDFs (t2m in °C, u10, v10 as float32 on one
+time/latitude/longitude grid) into compressed Zarr stores with consolidated
+metadata, in one or both layouts:
+  - "time":  ~one month of time steps per chunk over the full grid, for the
+             feature table (a month is one chunk read per variable)
+  - "space": lat/lon tiles holding years of time steps, for the climatology
+             (a tile's whole history is a few chunk reads)
+
+Stores are Zarr format 2, where consolidated metadata is part of the spec.
+Months are added one at a time, so memory stays at one month, and new months
+are appended along time. <store>.index.json next to the store records each
+source file's fingerprint and time range; a changed, removed or out-of-order file, new
+chunking, or an interrupted append rebuilds the store into a temp directory
+that is then swapped in.
+"""
+from __future__ import annotations
+
+import argparse
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from era5_stream import REQUIRED, normalize_varnames, open_month
+from utils import read_json, refresh_fingerprint, write_json_atomic
+
+LAYOUTS = ["time", "space"]
+DEFAULT_STORES = {"time": "data/processed/era5_hourly_time.zarr",
+                  "space": "data/processed/era5_hourly_space.zarr"}
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Consolidate ERA5 monthly files into chunked Zarr archives.")
+    p.add_argument("--hourly_dir", type=str, default="data/raw/era5_hourly_monthly")
+    p.add_argument("--layout", type=str, nargs="+", choices=LAYOUTS, default=LAYOUTS)
+    p.add_argument("--time_store", type=str, default=DEFAULT_STORES["time"])
+    p.add_argument("--space_store", type=str, default=DEFAULT_STORES["space"])
+    p.add_argument("--chunk_days", type=int, default=31, help="Days of time steps per chunk (time layout).")
+    p.add_argument("--tile", type=int, default=32, help="Lat/lon cells per tile side (space layout).")
+    p.add_argument("--tile_years", type=int, default=4, help="Years of time steps per chunk (space layout).")
+    p.add_argument("--full_rebuild", action="store_true")
+    return p.parse_args()
+
+
+def load_month(path: Path) -> xr.Dataset:
+    """One monthly file as loaded float32 t2m (°C)/u10/v10 with only time/latitude/longitude coords."""
+    with open_month(path) as ds:
+        ds = normalize_varnames(ds)[REQUIRED].reset_coords(drop=True).load()
+    return ds.astype(np.float32).drop_encoding().sortby("time")
+
+
+def steps_per_day(ds: xr.Dataset) -> int:
+    t = ds["time"].values
+    if len(t) < 2:
+        return 1
+    return max(1, int(round(np.timedelta64(1, "D") / np.median(np.diff(t)))))
+
+
+def chunk_sizes(layout: str, ds: xr.Dataset, chunk_days: int = 31, tile: int = 32,
+                tile_years: int = 4) -> dict[str, int]:
+    spd = steps_per_day(ds)
+    nlat, nlon = ds.sizes["latitude"], ds.sizes["longitude"]
+    if layout == "time":
+        return {"time": spd * chunk_days, "latitude": nlat, "longitude": nlon}
+    return {"time": spd * 366 * tile_years, "latitude": min(tile, nlat), "longitude": min(tile, nlon)}
+
+
+def open_archive(store) -> xr.Dataset:
+    """Lazy (dask-backed, one task per Zarr chunk) view of an archive."""
+    return xr.open_zarr(store, consolidated=True)
+
+
+def index_path(store) -> Path:
+    store = Path(store)
+    return store.with_name(store.name + ".index.json")
+
+
+def archive_index(store) -> dict:
+    index = read_json(index_path(store))
+    if index is None:
+        raise FileNotFoundError(f"No ERA5 archive at {store}; build it with era5_zarr.py")
+    return index
+
+
+def _n_time(store: Path) -> int | None:
+    try:
+        with open_archive(store) as ds:
+            return ds.sizes["time"]
+    except (FileNotFoundError, KeyError, ValueError):
+        return None
+
+
+def _write(ds: xr.Dataset, store: Path, chunks: dict[str, int] | None) -> None:
+    if chunks is not None:
+        enc = {v: {"chunks": tuple(chunks[d] for d in ds[v].dims)} for v in REQUIRED}
+        enc["time"] = {"units": "hours since 1900-01-01", "dtype": "int64"}
+        ds.to_zarr(store, mode="w", encoding=enc, consolidated=True, zarr_format=2)
+    else:
+        ds.to_zarr(store, append_dim="time", consolidated=True)
+
+
+def update_archive(files: list[Path], store, layout: str, full_rebuild: bool = False,
+                   **chunk_opts) -> dict:
+    """Append new monthly files to the archive (or rebuild it) and return its index."""
+    store = Path(store)
+    index = {} if full_rebuild else read_json(index_path(store), default={})
+    included = index.get("files", {})
+
+    fps, rebuild = {}, not included
+    for f in files:
+        fp, changed = refresh_fingerprint(f, included.get(f.name))
+        fps[f.name] = fp
+        if f.name in included and changed:
+            print(f"{f.name} changed since it was archived; rebuilding {store}.")
+            rebuild = True
+    if any(n not in fps for n in included):
+        print(f"Files were removed since the last build; rebuilding {store}.")
+        rebuild = True
+    if index and (index.get("layout") != layout or index.get("chunk_opts") != chunk_opts):
+        print(f"Layout or chunking changed; rebuilding {store}.")
+        rebuild = True
+    if not rebuild and _n_time(store) != index.get("n_time"):
+        print(f"{store} does not match its index (interrupted append?); rebuilding.")
+        rebuild = True
+
+    target = store.with_name(store.name + ".tmp") if rebuild else store
+    if rebuild:
+        if target.exists():
+            shutil.rmtree(target)
+        index_path(target).unlink(missing_ok=True)
+        included = {}
+        index = {"layout": layout, "chunk_opts": chunk_opts, "n_time": 0, "end": None, "files": included}
+
+    new = [f for f in files if f.name not in included]
+    print(f"{store}: appending {len(new)} file(s) ({len(included)} already archived)")
+    for f in new:
+        ds = load_month(f)
+        start, end = pd.Timestamp(ds["time"].values[0]), pd.Timestamp(ds["time"].values[-1])
+        if index["end"] is not None and start <= pd.Timestamp(index["end"]):
+            if not rebuild:
+                print(f"{f.name} starts before the end of the archive; rebuilding {store}.")
+                return update_archive(files, store, layout, full_rebuild=True, **chunk_opts)
+            raise ValueError(f"{f.name} overlaps or precedes the previous file; check the file names/order.")
+
+        first = index["n_time"] == 0
+        if first:
+            index["chunks"] = chunk_sizes(layout, ds, **chunk_opts)
+        _write(ds, target, index["chunks"] if first else None)
+        included[f.name] = {**fps[f.name], "start": str(start), "end": str(end)}
+        index.update(n_time=index["n_time"] + ds.sizes["time"], end=str(end))
+        # Saved after every month so an interrupted run resumes from here
+        write_json_atomic(index_path(target), index)
+        print(f"  + {f.name}: {ds.sizes['time']} steps")
+
+    if rebuild and index["n_time"]:
+        if store.exists():
+            shutil.rmtree(store)
+        target.rename(store)
+        index_path(target).replace(index_path(store))
+    return index
+
+
+def main():
+    args = parse_args()
+    files = sorted(Path(args.hourly_dir).glob("*.nc"))
+    if not files:
+        raise FileNotFoundError(f"No .nc files found in {args.hourly_dir}")
+
+    stores = {"time": args.time_store, "space": args.space_store}
+    for layout in args.layout:
+        opts = {"chunk_days": args.chunk_days} if layout == "time" else {"tile": args.tile, "tile_years": args.tile_years}
+        index = update_archive(files, stores[layout], layout, full_rebuild=args.full_rebuild, **opts)
+        print(f"Archive {stores[layout]} ({layout} layout, chunks {index['chunks']}): "
+              f"{index['n_time']} steps to {index['end']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,11 +2,12 @@
 
 import joblib
 import pandas as pd
-import matplotlib.pyplot as plt
-from sklearn.metrics import mean_absolute_error, mean_squared_error
-from config import PROCESSED_DIR, MODELS_DIR, REPORTS_DIR
+from config import PROCESSED_DIR, MODELS_DIR, FIGURES_DIR, ensure_parent
 
 def main():
+    import matplotlib.pyplot as plt
+    from sklearn.metrics import mean_absolute_error, mean_squared_error
+
     df = pd.read_parquet(PROCESSED_DIR / "modeling_table.parquet")
     model = joblib.load(MODELS_DIR / "model.joblib")
 
@@ -24,7 +25,7 @@ def main():
     plt.plot(df["date"], preds, label="Predicted")
     plt.legend()
     plt.title("Actual vs Predicted")
-    fig_path = REPORTS_DIR / "figures" / "actual_vs_pred.png"
+    fig_path = ensure_parent(FIGURES_DIR / "actual_vs_pred.png")
     plt.savefig(fig_path, dpi=150, bbox_inches="tight")
     print(f"Saved figure: {fig_path}")
 
@@ -1,108 +1,133 @@
+from __future__ import annotations
+
 import argparse
 from pathlib import Path
+import numpy as np
 import pandas as pd
 import xarray as xr
-import numpy as np
+
+from features import FEATURE_COLS, features_from_anomalies
+from regions import Region, RegionMask, long_frame, resolve_regions
+from build_forecast_climatology import DEFAULT_STORE, GridClimatology, climatology_on_grid, open_store
+from regrid import DEFAULT_CACHE_DIR
+from storage import write_table
 
 
 def parse_args():
     p = argparse.ArgumentParser()
     p.add_argument("--anoms_nc", type=str, default="data/processed/forecast_anoms.nc")
     p.add_argument("--clim_nc", type=str, default="data/processed/climatology_doy.nc")
-    p.add_argument("--out", type=str, default="data/processed/forecast_features.csv")
+    p.add_argument("--out", type=str, default="data/processed/forecast_features.parquet")
     p.add_argument("--hot_thresh", type=float, default=8.0)
     p.add_argument("--cold_thresh", type=float, default=-8.0)
     p.add_argument("--base_c", type=float, default=18.0, help="Base temp for degree days (°C).")
+    p.add_argument("--regrid_cache", type=str, default=str(DEFAULT_CACHE_DIR))
+    p.add_argument("--clim_store", type=str, default=DEFAULT_STORE,
+                   help="Forecast-grid climatology from build_forecast_climatology.py (used if current).")
+    p.add_argument("--regions", type=str, nargs="+", default=None,
+                   help="Features per region (names, 'all' or a .json) instead of over the whole subset.")
     return p.parse_args()
 
 
-def _squeeze_time(da: xr.DataArray) -> xr.DataArray:
-    # Forecast files sometimes have time/valid_time dims of length 1
-    for dim in ["time", "valid_time", "step"]:
-        if dim in da.dims:
-            da = da.isel({dim: 0})
-    return da
+LEAD_DIMS = ["step", "valid_time", "time"]
 
 
-def main():
-    args = parse_args()
-    ds = xr.open_dataset(args.anoms_nc)
-    clim = xr.open_dataset(args.clim_nc)
+def _lead_dim(da: xr.DataArray) -> str | None:
+    """The dim that stacks several leads/times, if any."""
+    return next((d for d in LEAD_DIMS if d in da.dims and da.sizes[d] > 1), None)
+
+
+def _fields(da: xr.DataArray, lead_dim: str | None):
+    # Forecast files sometimes have time/valid_time dims of length 1
+    for dim in LEAD_DIMS:
+        if dim in da.dims and dim != lead_dim:
+            da = da.isel({dim: 0})
+    if lead_dim is None:
+        return da.values[None]
+    return da.transpose(lead_dim, "latitude", "longitude").values
 
-    # --- anomalies (2m temp, 10m winds) ---
-    da_t = _squeeze_time(ds["t2m_anom_c"])
-    da_u = _squeeze_time(ds["u10_anom"])
-    da_v = _squeeze_time(ds["v10_anom"])
-    wind_mag = np.sqrt(da_u**2 + da_v**2)
 
-    # --- valid date & day-of-year ---
-    valid_date = None
-    valid_dt = None
+def _valid_times(ds: xr.Dataset, n: int) -> pd.DatetimeIndex:
     for name in ["valid_time", "time"]:
         if name in ds.coords:
             try:
-                valid_dt = pd.to_datetime(ds[name].values)
-                # if array-like, take first
-                if hasattr(valid_dt, "__len__") and not isinstance(valid_dt, pd.Timestamp):
-                    valid_dt = pd.to_datetime(valid_dt.ravel()[0])
-                valid_date = valid_dt.date()
-                break
+                t = pd.DatetimeIndex(np.atleast_1d(ds[name].values).ravel())
+                return t if len(t) == n else t[:1].repeat(n)
             except Exception:
                 pass
-    if valid_dt is None:
-        # fallback: just use "today" not ideal, but prevents crash
-        valid_dt = pd.Timestamp.utcnow()
-        valid_date = valid_dt.date()
-
-    doy = int(valid_dt.dayofyear)
-
-    # --- reconstruct absolute forecast temperature from climatology + anomaly ---
-    # Select climatology for doy, then interpolate to forecast grid
-    Tc = clim["t2m"].sel(doy=doy)
-
-    # Make sure climatology lon/lat names match forecast
-    # (your files use latitude/longitude)
-    Tc_i = Tc.interp(latitude=ds["latitude"], longitude=ds["longitude"])
-
-    T_forecast = Tc_i + da_t  # °C
-
-    base = float(args.base_c)
-
-    # Degree days (absolute)
-    cdd = (T_forecast - base).clip(min=0.0)
-    hdd = (base - T_forecast).clip(min=0.0)
+    # fallback: just use "today" not ideal, but prevents crash
+    return pd.DatetimeIndex([pd.Timestamp.utcnow().tz_localize(None)] * n)
+
+
+def _lead_hours(ds: xr.Dataset, n: int) -> np.ndarray:
+    if "step" in ds.coords:
+        h = np.atleast_1d(ds["step"].values / np.timedelta64(1, "h")).round().astype(np.int64)
+        return h if len(h) == n else np.repeat(h[:1], n)
+    return np.zeros(n, dtype=np.int64)
+
+
+def extract_features(
+    ds: xr.Dataset,
+    clim: xr.Dataset,
+    hot_thresh: float = 8.0,
+    cold_thresh: float = -8.0,
+    base_c: float = 18.0,
+    cache_dir: Path | None = DEFAULT_CACHE_DIR,
+    clim_store: GridClimatology | None = None,
+    regions: dict[str, Region] | None = None,
+) -> pd.DataFrame:
+    """
+    Regional feature rows (same columns as the ERA5 feature table), one per
+    lead when the anomalies are stacked along step/valid_time, keyed by
+    valid_date and lead_h. With regions, one row per (lead, region) from the
+    same pass, area-weighted within each region.
+    """
+    lead_dim = _lead_dim(ds["t2m_anom_c"])
+    t, u, v = (_fields(ds[name], lead_dim) for name in ("t2m_anom_c", "u10_anom", "v10_anom"))
+    n = t.shape[0]
+
+    # --- valid date & day-of-year per row ---
+    valid_dt = _valid_times(ds, n)
+    doys = np.asarray(valid_dt.dayofyear)
+
+    # --- features (one fused pass per valid doy, shared with the ERA5 feature table) ---
+    # Absolute forecast temperature is rebuilt from climatology + anomaly; the
+    # climatology comes from the precomputed store slice or the cached regrid weights.
+    mask = None if regions is None else RegionMask(regions, ds["latitude"].values, ds["longitude"].values)
+    cols = {c: np.empty(n if mask is None else (n, len(mask.names))) for c in FEATURE_COLS}
+    for doy in np.unique(doys):
+        rows = np.flatnonzero(doys == doy)
+        Tc_i = climatology_on_grid(int(doy), ds["latitude"], ds["longitude"], clim, store=clim_store,
+                                   variables=["t2m"], cache_dir=cache_dir)["t2m"]
+        feats = features_from_anomalies(
+            t[rows], u[rows], v[rows], Tc_i.values,
+            hot_thresh=hot_thresh, cold_thresh=cold_thresh, base_c=base_c, mask=mask,
+        )
+        for c in FEATURE_COLS:
+            cols[c][rows] = feats[c]
+
+    keys = {"valid_date": valid_dt.normalize(), "doy": doys.astype(np.int64), "lead_h": _lead_hours(ds, n)}
+    if mask is not None:
+        return long_frame(cols, mask.names, keys)[[*FEATURE_COLS, *keys, "region"]]
+    out = pd.DataFrame(cols)
+    for k, v in keys.items():
+        out[k] = v
+    return out
 
-    # Degree days climatology for that doy
-    cdd_clim = (Tc_i - base).clip(min=0.0)
-    hdd_clim = (base - Tc_i).clip(min=0.0)
 
-    cdd_anom = cdd - cdd_clim
-    hdd_anom = hdd - hdd_clim
-
-    # --- features ---
-    features = {
-        "t2m_anom_mean_c": float(da_t.mean().values),
-        "t2m_anom_max_c": float(da_t.max().values),
-        "t2m_anom_min_c": float(da_t.min().values),
-        "hot_area_frac": float((da_t > args.hot_thresh).mean().values),
-        "cold_area_frac": float((da_t < args.cold_thresh).mean().values),
-        "wind_anom_mag_mean": float(wind_mag.mean().values),
-
-        # Degree day features
-        "cdd_mean": float(cdd.mean().values),
-        "hdd_mean": float(hdd.mean().values),
-        "cdd_anom_mean": float(cdd_anom.mean().values),
-        "hdd_anom_mean": float(hdd_anom.mean().values),
+def main():
+    args = parse_args()
+    ds = xr.open_dataset(args.anoms_nc)
+    clim = xr.open_dataset(args.clim_nc)
 
-        "valid_date": valid_date,
-        "doy": doy,
-    }
+    store = open_store(args.clim_store, args.clim_nc, ds["latitude"], ds["longitude"])
 
-    out_df = pd.DataFrame([features])
+    out_df = extract_features(ds, clim, hot_thresh=args.hot_thresh,
+                              cold_thresh=args.cold_thresh, base_c=args.base_c,
+                              cache_dir=Path(args.regrid_cache), clim_store=store,
+                              regions=resolve_regions(args.regions) if args.regions else None)
 
-    out_path = Path(args.out)
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    out_df.to_csv(out_path, index=False)
+    out_path = write_table(out_df, args.out, "forecast_features")
     print(f"Saved forecast features to {out_path.resolve()}")
 
 
@@ -0,0 +1,236 @@
+"""
+Regional weather features shared by the ERA5 history and the GFS forecast path.
+
+Every statistic is computed in one pass over the grid, a block of time steps at
+a time, so temporaries never exceed one block. HDD is derived from CDD
+(hdd = cdd - (T - base)) instead of clipping a second time, and the
+degree-day anomalies reuse the same buffers.
+
+Given a regions.RegionMask, the same statistics are computed for every region
+at once: sums become one sparse product with the cos-latitude weights, so
+means and area fractions are area-weighted, and outputs are (n, n_regions).
+"""
+from __future__ import annotations
+
+from typing import Callable
+
+import numpy as np
+
+FEATURE_COLS = [
+    "t2m_anom_mean_c",
+    "t2m_anom_max_c",
+    "t2m_anom_min_c",
+    "hot_area_frac",
+    "cold_area_frac",
+    "wind_anom_mag_mean",
+    "cdd_mean",
+    "hdd_mean",
+    "cdd_anom_mean",
+    "hdd_anom_mean",
+]
+
+# Optional ERA5 columns from the daily max/min of absolute 2 m temperature
+# (build_era5_feature_table.py --daily_extremes); not model inputs
+EXTREME_COLS = ["t2m_dmax_mean_c", "t2m_dmin_mean_c", "t2m_drange_mean_c"]
+
+
+def _block_stats(ta, ua, va, tc, hot_thresh: float, cold_thresh: float, base_c: float) -> dict:
+    """
+    Features for a block of time steps. All inputs are (k, ncell) float arrays
+    except tc, which may be (1, ncell). NaNs are skipped in means (like xarray's
+    skipna) and count as "not hot/cold" in the area fractions.
+    """
+    ncell = ta.shape[1]
+    n_t = np.count_nonzero(~np.isnan(ta), axis=1)
+
+    # Temperature anomaly stats
+    s_t = np.nansum(ta, axis=1)
+    t_max = np.fmax.reduce(ta, axis=1)
+    t_min = np.fmin.reduce(ta, axis=1)
+    hot = np.count_nonzero(ta > hot_thresh, axis=1) / ncell
+    cold = np.count_nonzero(ta < cold_thresh, axis=1) / ncell
+
+    # Wind anomaly magnitude
+    w = np.hypot(ua, va)
+    n_w = np.count_nonzero(~np.isnan(w), axis=1)
+    s_w = np.nansum(w, axis=1)
+
+    # Degree days: d = T - base with T = clim + anomaly
+    d = tc + ta
+    d -= base_c
+    valid_d = ~np.isnan(d)
+    n_d = np.count_nonzero(valid_d, axis=1)
+    s_d = np.nansum(d, axis=1)
+    cdd = np.maximum(d, 0.0, out=d)  # d is not needed after this point
+    s_cdd = np.nansum(cdd, axis=1)
+
+    # cdd_anom = cdd - clip(tc - base); hdd_anom = cdd_anom - ta
+    cdd -= np.maximum(tc - base_c, 0.0)
+    s_cdd_anom = np.nansum(cdd, axis=1)
+    s_ta_d = np.nansum(ta * valid_d, axis=1)  # ta over cells where T is defined
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {
+            "t2m_anom_mean_c": s_t / n_t,
+            "t2m_anom_max_c": t_max,
+            "t2m_anom_min_c": t_min,
+            "hot_area_frac": hot,
+            "cold_area_frac": cold,
+            "wind_anom_mag_mean": s_w / n_w,
+            "cdd_mean": s_cdd / n_d,
+            "hdd_mean": (s_cdd - s_d) / n_d,
+            "cdd_anom_mean": s_cdd_anom / n_d,
+            "hdd_anom_mean": (s_cdd_anom - s_ta_d) / n_d,
+        }
+
+
+def _nan0(a: np.ndarray) -> np.ndarray:
+    return np.where(np.isnan(a), 0.0, a)
+
+
+def _region_block_stats(ta, ua, va, tc, mask, hot_thresh: float, cold_thresh: float,
+                        base_c: float) -> dict:
+    """
+    _block_stats() per region: inputs are restricted to mask.cells and every
+    sum is an area-weighted grouped sum, giving (k, n_regions) arrays.
+    """
+    ta, ua, va = ta[:, mask.cells], ua[:, mask.cells], va[:, mask.cells]
+    tc = tc[:, mask.cells]
+    wsum = mask.wsum
+
+    valid_t = ~np.isnan(ta)
+    n_t = wsum(valid_t.astype(np.float64))
+    s_t = wsum(_nan0(ta))
+    t_max = np.stack([np.fmax.reduce(ta[:, m], axis=1) for m in mask.members], axis=1)
+    t_min = np.stack([np.fmin.reduce(ta[:, m], axis=1) for m in mask.members], axis=1)
+    hot = wsum((ta > hot_thresh).astype(np.float64)) / mask.total
+    cold = wsum((ta < cold_thresh).astype(np.float64)) / mask.total
+
+    w = np.hypot(ua, va)
+    n_w = wsum((~np.isnan(w)).astype(np.float64))
+    s_w = wsum(_nan0(w))
+
+    d = tc + ta
+    d -= base_c
+    valid_d = ~np.isnan(d)
+    n_d = wsum(valid_d.astype(np.float64))
+    s_d = wsum(_nan0(d))
+    cdd = np.maximum(d, 0.0, out=d)
+    s_cdd = wsum(_nan0(cdd))
+
+    cdd -= np.maximum(tc - base_c, 0.0)
+    s_cdd_anom = wsum(_nan0(cdd))
+    s_ta_d = wsum(np.where(valid_d, ta, 0.0))
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {
+            "t2m_anom_mean_c": s_t / n_t,
+            "t2m_anom_max_c": t_max,
+            "t2m_anom_min_c": t_min,
+            "hot_area_frac": hot,
+            "cold_area_frac": cold,
+            "wind_anom_mag_mean": s_w / n_w,
+            "cdd_mean": s_cdd / n_d,
+            "hdd_mean": (s_cdd - s_d) / n_d,
+            "cdd_anom_mean": s_cdd_anom / n_d,
+            "hdd_anom_mean": (s_cdd_anom - s_ta_d) / n_d,
+        }
+
+
+def _run_blocks(n: int, get_block: Callable, chunk_size: int, mask=None, **kw) -> dict[str, np.ndarray]:
+    shape = n if mask is None else (n, len(mask.names))
+    out = {c: np.empty(shape) for c in FEATURE_COLS}
+    for i in range(0, n, chunk_size):
+        block = get_block(slice(i, min(i + chunk_size, n)))
+        if mask is None:
+            stats = _block_stats(*block, **kw)
+        else:
+            stats = _region_block_stats(*block, mask, **kw)
+        for c in FEATURE_COLS:
+            out[c][i:i + chunk_size] = stats[c]
+    return out
+
+
+def _flat(a, sl=None) -> np.ndarray:
+    """Slice the leading axis (if given) and flatten lat/lon into float64 (k, ncell)."""
+    a = np.asarray(a if sl is None else a[sl], dtype=np.float64)
+    return a.reshape(-1, a.shape[-2] * a.shape[-1])
+
+
+def features_from_fields(
+    t,
+    u,
+    v,
+    clim_t,
+    clim_u,
+    clim_v,
+    clim_idx,
+    hot_thresh: float = 8.0,
+    cold_thresh: float = -8.0,
+    base_c: float = 18.0,
+    chunk_size: int = 32,
+    mask=None,
+) -> dict[str, np.ndarray]:
+    """
+    Features for daily fields t/u/v shaped (time, lat, lon), with anomalies
+    taken against climatology arrays shaped (doy, lat, lon). clim_idx gives the
+    climatology row for each time step. Inputs may be numpy or dask arrays;
+    only one block of time steps is materialized at a time. With a RegionMask,
+    outputs are (time, n_regions).
+    """
+    clim_idx = np.asarray(clim_idx)
+    clim_t, clim_u, clim_v = (np.asarray(c) for c in (clim_t, clim_u, clim_v))
+
+    def get_block(sl):
+        ci = clim_idx[sl]
+        tc = _flat(clim_t[ci])
+        return (_flat(t, sl) - tc, _flat(u, sl) - _flat(clim_u[ci]),
+                _flat(v, sl) - _flat(clim_v[ci]), tc)
+
+    return _run_blocks(len(clim_idx), get_block, chunk_size, mask=mask,
+                       hot_thresh=hot_thresh, cold_thresh=cold_thresh, base_c=base_c)
+
+
+def features_from_anomalies(
+    t_anom,
+    u_anom,
+    v_anom,
+    t_clim,
+    hot_thresh: float = 8.0,
+    cold_thresh: float = -8.0,
+    base_c: float = 18.0,
+    chunk_size: int = 32,
+    mask=None,
+) -> dict[str, np.ndarray]:
+    """
+    Features for anomaly fields shaped (lat, lon) or (n, lat, lon), given the
+    temperature climatology on the same grid (lat, lon) to rebuild absolute
+    temperature for the degree days. With a RegionMask, outputs are (n, n_regions).
+    """
+    t_anom, u_anom, v_anom = (np.asarray(a) for a in (t_anom, u_anom, v_anom))
+    if t_anom.ndim == 2:
+        t_anom, u_anom, v_anom = t_anom[None], u_anom[None], v_anom[None]
+    tc = _flat(t_clim)
+
+    def get_block(sl):
+        return _flat(t_anom, sl), _flat(u_anom, sl), _flat(v_anom, sl), tc
+
+    return _run_blocks(t_anom.shape[0], get_block, chunk_size, mask=mask,
+                       hot_thresh=hot_thresh, cold_thresh=cold_thresh, base_c=base_c)
+
+
+def regional_means(fields: dict[str, object], mask=None) -> dict[str, np.ndarray]:
+    """
+    NaN-skipping mean over the grid of each (n, lat, lon) field: (n,) arrays,
+    or area-weighted (n, n_regions) with a RegionMask.
+    """
+    out = {}
+    for name, a in fields.items():
+        a = _flat(a)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if mask is None:
+                out[name] = np.nansum(a, axis=1) / np.count_nonzero(~np.isnan(a), axis=1)
+            else:
+                a = a[:, mask.cells]
+                out[name] = mask.wsum(_nan0(a)) / mask.wsum((~np.isnan(a)).astype(np.float64))
+    return out
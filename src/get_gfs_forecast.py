@@ -2,12 +2,26 @@
 from __future__ import annotations
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
 from datetime import timedelta
+from typing import TYPE_CHECKING
 
+import numpy as np
+import pandas as pd
 import xarray as xr
-from herbie import Herbie
+
+import precision
+from gfs_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_GB, SubsetCache, subset_key
+from gfs_probe import DEFAULT_TIMEOUT_S, ProbeCache, file_index_probe, herbie_probe, newest_available
+from regions import domain_box, resolve_regions
+
+if TYPE_CHECKING:
+    from herbie import Herbie
+
+# One inventory search for all three surface fields (regex over GRIB index lines)
+SURFACE_SEARCH = r":(?:TMP:2 m|UGRD:10 m|VGRD:10 m) above ground"
 
 def candidate_inits_utc(n_cycles: int = 6) -> list[str]:
     """
@@ -32,6 +46,9 @@ def parse_args():
     p.add_argument("--init", type=str, default=None,
                    help="Init time UTC like '2025-12-25 18:00'. Default: latest 00/06/12/18 cycle today (UTC).")
     p.add_argument("--fxx", type=int, default=24, help="Forecast lead hours (e.g., 24 for tomorrow).")
+    p.add_argument("--fxx_range", type=int, nargs=3, metavar=("START", "END", "STEP"), default=None,
+                   help="Fetch every lead in [START, END] by STEP (e.g. 0 240 6) into one file with a step dim.")
+    p.add_argument("--workers", type=int, default=8, help="Leads downloaded concurrently with --fxx_range.")
     p.add_argument("--product", type=str, default="pgrb2.0p25")
 
     # Default box ~Texas/OK region; change later if you want.
@@ -39,8 +56,22 @@ def parse_args():
     p.add_argument("--north", type=float, default=37.0)
     p.add_argument("--west", type=float, default=-107.0)
     p.add_argument("--east", type=float, default=-93.0)
+    p.add_argument("--regions", type=str, nargs="+", default=None,
+                   help="Fetch one domain covering these regions (names, 'all' or a .json); overrides the box.")
 
     p.add_argument("--out", type=str, default="data/processed/gfs_subset.nc")
+    p.add_argument("--precision", type=str, choices=precision.POLICIES, default=precision.DEFAULT_POLICY)
+
+    # Local cache of cropped subsets, keyed by (cycle, lead, product, box)
+    p.add_argument("--cache_dir", type=str, default=str(DEFAULT_CACHE_DIR))
+    p.add_argument("--cache_max_gb", type=float, default=DEFAULT_MAX_GB)
+    p.add_argument("--no_cache", action="store_true")
+
+    # Cycle availability probing (when --init is not given)
+    p.add_argument("--probe_timeout", type=float, default=DEFAULT_TIMEOUT_S,
+                   help="Seconds to wait for the concurrent availability probes.")
+    p.add_argument("--probe_index", type=str, default=None,
+                   help="Probe a local NOMADS-style directory of .idx files instead of the network.")
     return p.parse_args()
 
 
@@ -65,56 +96,166 @@ def _pick_surface_cube(ds_or_list, exact_var: str) -> xr.Dataset:
     return ds_or_list
 
 
-def _normalize_lon(ds: xr.Dataset) -> xr.Dataset:
-    lon = ds.longitude
-    if lon.max() > 180:
-        ds = ds.assign_coords(longitude=((lon + 180) % 360) - 180).sortby("longitude")
-    return ds
+def _as_slice(idx: np.ndarray):
+    """A contiguous ascending index run as a slice (cheaper for lazy GRIB arrays)."""
+    if len(idx) and np.all(np.diff(idx) == 1):
+        return slice(int(idx[0]), int(idx[-1]) + 1)
+    return idx
 
 
-def main():
-    args = parse_args()
+def crop_box(ds: xr.Dataset, south: float, north: float, west: float, east: float) -> xr.Dataset:
+    """
+    Cut the box out of a global field by index, before anything is loaded.
+    Longitudes may be 0..360 or -180..180; west/east are -180..180. A box that
+    crosses the 0-360 seam is taken as two runs, so the globe is never sorted.
+    Latitude keeps its native order.
+    """
+    lat = ds["latitude"].values
+    lon180 = ((ds["longitude"].values + 180) % 360) - 180
+    iy = np.flatnonzero((lat >= south) & (lat <= north))
+    ix = np.flatnonzero((lon180 >= west) & (lon180 <= east))
+    ix = ix[np.argsort(lon180[ix], kind="stable")]  # west -> east; only region-sized
+    out = ds.isel(latitude=_as_slice(iy), longitude=_as_slice(ix))
+    return out.assign_coords(longitude=("longitude", lon180[ix], ds["longitude"].attrs))
+
+
+def find_cycle(init_candidates: list[str], fxx: int, product: str = "pgrb2.0p25",
+               probe=herbie_probe, timeout_s: float = DEFAULT_TIMEOUT_S,
+               probe_cache: ProbeCache | None = None) -> Herbie:
+    """Return a Herbie handle for the newest candidate init whose inventory exists."""
+    init = newest_available(init_candidates, fxx, product, probe=probe, timeout_s=timeout_s, cache=probe_cache)
+    if init is None:
+        raise RuntimeError(f"Could not find an available GFS cycle for fxx={fxx} "
+                           f"among {init_candidates}.")
+    print(f"Using init {init} UTC (found inventory)")
+    from herbie import Herbie
+
+    return Herbie(init, model="gfs", product=product, fxx=fxx)
+
+
+def fetch_lead(
+    H: Herbie,
+    south: float = 25.0,
+    north: float = 37.0,
+    west: float = -107.0,
+    east: float = -93.0,
+) -> xr.Dataset:
+    """t2m/u10/v10 regional subset for one Herbie cycle/lead, from one combined search."""
+    # May return multiple "hypercube" datasets (2 m vs 10 m); pick the surface cube per var.
+    cubes = H.xarray(SURFACE_SEARCH)
+
+    # Keep only surface vars, cropped to the region before merging or loading
+    box = dict(south=south, north=north, west=west, east=east)
+    ds_t = crop_box(_pick_surface_cube(cubes, "t2m")[["t2m"]], **box)
+    ds_u = crop_box(_pick_surface_cube(cubes, "u10")[["u10"]], **box)
+    ds_v = crop_box(_pick_surface_cube(cubes, "v10")[["v10"]], **box)
+
+    return xr.merge([ds_t, ds_u, ds_v], compat="override")
+
+
+def _cached(cache: SubsetCache | None, init, fxx: int, product: str, box: dict, fetch) -> xr.Dataset:
+    if cache is None:
+        return fetch()
+    key = subset_key(init, fxx, product, search=SURFACE_SEARCH, policy=cache.precision, **box)
+    return cache.get_or_fetch(key, fetch)
+
+
+def fetch_subset(
+    init: str | None = None,
+    fxx: int = 24,
+    product: str = "pgrb2.0p25",
+    south: float = 25.0,
+    north: float = 37.0,
+    west: float = -107.0,
+    east: float = -93.0,
+    cache: SubsetCache | None = None,
+    probe_opts: dict | None = None,
+) -> xr.Dataset:
+    """
+    Download t2m/u10/v10 for one GFS cycle/lead and return the regional subset.
+    If init is None, try a few recent cycles (newest first). With a cache,
+    an explicit init that was fetched before needs no network access.
+    """
+    box = dict(south=south, north=north, west=west, east=east)
+    if cache is not None and init:
+        hit = cache.get(subset_key(init, fxx, product, search=SURFACE_SEARCH, policy=cache.precision, **box))
+        if hit is not None:
+            print(f"Using cached subset for init {init} UTC, fxx={fxx}")
+            return hit
+
     # If user provides --init, use it. Otherwise try a few recent cycles.
-    init_candidates = [args.init] if args.init else candidate_inits_utc(n_cycles=8)
+    init_candidates = [init] if init else candidate_inits_utc(n_cycles=8)
+    H = find_cycle(init_candidates, fxx=fxx, product=product, **(probe_opts or {}))
+    return _cached(cache, H.date, fxx, product, box, lambda: fetch_lead(H, **box))
+
+
+def fetch_leads(
+    fxx_list: list[int],
+    init: str | None = None,
+    product: str = "pgrb2.0p25",
+    south: float = 25.0,
+    north: float = 37.0,
+    west: float = -107.0,
+    east: float = -93.0,
+    workers: int = 8,
+    cache: SubsetCache | None = None,
+    probe_opts: dict | None = None,
+) -> xr.Dataset:
+    """
+    Download many leads of one cycle concurrently and stack them along 'step'
+    (valid_time becomes a coordinate along step). Without an explicit init the
+    cycle is chosen by checking the longest lead, so every requested lead exists.
+    """
+    box = dict(south=south, north=north, west=west, east=east)
+    H0 = None
+    if init:
+        cycle = pd.Timestamp(init)
+    else:
+        H0 = find_cycle(candidate_inits_utc(n_cycles=8), fxx=max(fxx_list), product=product,
+                        **(probe_opts or {}))
+        cycle = H0.date
 
+    def one(fxx: int) -> xr.Dataset:
+        def fetch():
+            from herbie import Herbie
+
+            H = H0 if H0 is not None and fxx == H0.fxx else Herbie(cycle, model="gfs", product=product, fxx=fxx)
+            return fetch_lead(H, **box)
+
+        ds = _cached(cache, cycle, fxx, product, box, fetch).load()
+        print(f"  fxx={fxx:03d} done")
+        return ds
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        leads = list(pool.map(one, sorted(fxx_list)))
+
+    return xr.concat(leads, dim="step", coords="different", compat="equals")
+
+
+def main():
+    args = parse_args()
     out_path = Path(args.out)
     out_path.parent.mkdir(parents=True, exist_ok=True)
 
-    H = None
-    last_err = None
-    for init in init_candidates:
-        try:
-            H = Herbie(init, model="gfs", product=args.product, fxx=args.fxx)
-            # Force an inventory check early so we know it exists
-            _ = H.inventory("TMP:2 m")
-            print(f"Using init {init} UTC (found inventory)")
-            break
-        except Exception as e:
-            last_err = e
-            H = None
-
-    if H is None:
-        raise RuntimeError(f"Could not find an available GFS cycle for fxx={args.fxx}. Last error:\n{last_err}")
-    
-    # These may return multiple "hypercube" datasets; pick the surface cube.
-    ds_t = _pick_surface_cube(H.xarray("TMP:2 m"), "t2m")
-    ds_u = _pick_surface_cube(H.xarray("UGRD:10 m"), "u10")
-    ds_v = _pick_surface_cube(H.xarray("VGRD:10 m"), "v10")
-
-    # Keep only surface vars
-    ds_t = ds_t[["t2m"]]
-    ds_u = ds_u[["u10"]]
-    ds_v = ds_v[["v10"]]
-
-    ds = xr.merge([ds_t, ds_u, ds_v], compat="override")
-
-    ds = _normalize_lon(ds)
-
-    # Subset region (latitude in GRIB is often descending)
-    ds = ds.sel(latitude=slice(args.north, args.south),
-                longitude=slice(args.west, args.east))
-
-    ds.to_netcdf(out_path)
+    box = dict(south=args.south, north=args.north, west=args.west, east=args.east)
+    if args.regions:
+        box = domain_box(resolve_regions(args.regions))
+    cache = None if args.no_cache else SubsetCache(args.cache_dir, max_gb=args.cache_max_gb,
+                                                   policy=args.precision)
+    probe_opts = {
+        "probe": file_index_probe(args.probe_index) if args.probe_index else herbie_probe,
+        "timeout_s": args.probe_timeout,
+        "probe_cache": None if args.no_cache else ProbeCache(Path(args.cache_dir) / "probes.json"),
+    }
+    if args.fxx_range:
+        start, end, step = args.fxx_range
+        ds = fetch_leads(list(range(start, end + 1, step)), init=args.init, product=args.product,
+                         workers=args.workers, cache=cache, probe_opts=probe_opts, **box)
+    else:
+        ds = fetch_subset(args.init, fxx=args.fxx, product=args.product, cache=cache,
+                          probe_opts=probe_opts, **box)
+
+    precision.to_netcdf(ds, out_path, args.precision)
     print(f"Saved forecast subset to {out_path.resolve()}")
 
 
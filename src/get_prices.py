@@ -1,18 +1,20 @@
 from __future__ import annotations
 import argparse
 import pandas as pd
-import yfinance as yf
-from pathlib import Path
+
+from storage import write_table
 
 def parse_args():
     p = argparse.ArgumentParser()
     p.add_argument("--ticker", type=str, default="XLE")
     p.add_argument("--start", type=str, default="2005-01-01")
-    p.add_argument("--out", type=str, default="data/processed/prices.csv")
+    p.add_argument("--out", type=str, default="data/processed/prices.parquet")
     return p.parse_args()
 
 def main():
     args = parse_args()
+    import yfinance as yf
+
     df = yf.download(args.ticker, start=args.start, auto_adjust=True, progress=False)
 
     if df.empty:
@@ -24,9 +26,7 @@ def main():
     # target: next-day absolute return (a simple volatility proxy)
     df["target_next_absret"] = df["ret"].shift(-1).abs()
 
-    out = Path(args.out)
-    out.parent.mkdir(parents=True, exist_ok=True)
-    df.to_csv(out, index=False)
+    out = write_table(df, args.out, "prices")
     print(f"Saved prices to {out.resolve()}")
 
 if __name__ == "__main__":
@@ -0,0 +1,104 @@
+# src/gfs_cache.py
+"""
+Content-addressed on-disk cache of regional GFS subsets.
+
+Entries are keyed by a hash of (model, cycle, lead, product, box, search,
+precision policy) and stored as NetCDF compressed per that policy, so a run
+under one policy never reads a subset packed under another. A hit touches
+the entry's mtime, so eviction removes the least recently used entries
+first once the cache grows past max_bytes.
+Writes go to a temp file that is renamed into place; puts and evictions hold
+an inter-process lock so concurrent runs can share one cache directory.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Callable
+
+import pandas as pd
+import xarray as xr
+
+import precision
+from config import RAW_DIR
+from utils import file_lock
+
+DEFAULT_CACHE_DIR = RAW_DIR / "gfs_cache"
+DEFAULT_MAX_GB = 5.0
+
+
+def subset_key(init, fxx: int, product: str, south: float, north: float, west: float, east: float,
+               model: str = "gfs", search: str = "", policy: str = precision.DEFAULT_POLICY) -> str:
+    spec = {
+        "model": model,
+        "init": pd.Timestamp(init).strftime("%Y-%m-%d %H:%M"),
+        "fxx": int(fxx),
+        "product": product,
+        "box": [round(float(x), 4) for x in (south, north, west, east)],
+        "search": search,
+        "precision": policy,
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:32]
+
+
+class SubsetCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_gb: float = DEFAULT_MAX_GB,
+                 policy: str = precision.DEFAULT_POLICY):
+        self.dir = Path(cache_dir)
+        self.precision = policy
+        self.max_bytes = int(max_gb * 1e9)
+        self.lock_path = self.dir / ".lock"
+
+    def _path(self, key: str) -> Path:
+        return self.dir / f"{key}.nc"
+
+    def get(self, key: str) -> xr.Dataset | None:
+        """Cached dataset loaded into memory (so the file is not held open), or None."""
+        path = self._path(key)
+        try:
+            with xr.open_dataset(path) as ds:
+                ds = ds.load().drop_encoding()
+            os.utime(path)  # mark as recently used
+        except (FileNotFoundError, OSError):
+            return None
+        return ds
+
+    def put(self, key: str, ds: xr.Dataset) -> None:
+        self.dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.dir / f".{key}.{uuid.uuid4().hex}.tmp"
+        ds = ds.drop_encoding()
+        ds.to_netcdf(tmp, encoding=precision.encoding(ds, self.precision))
+        with file_lock(self.lock_path):
+            os.replace(tmp, self._path(key))
+            self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        for p in self.dir.glob("*.nc"):
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        total = sum(e[1] for e in entries)
+        for _, size, p in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            try:
+                p.unlink()
+                total -= size
+            except OSError:
+                # e.g. open by a reader on Windows; try again on the next put
+                pass
+
+    def get_or_fetch(self, key: str, fetch: Callable[[], xr.Dataset]) -> xr.Dataset:
+        ds = self.get(key)
+        if ds is not None:
+            print(f"GFS cache hit {key}")
+            return ds
+        ds = fetch().load()
+        self.put(key, ds)
+        return ds
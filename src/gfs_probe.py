@@ -0,0 +1,148 @@
+# src/gfs_probe.py
+"""
+Concurrent availability probing for GFS cycles.
+
+All candidate cycles are probed at once with a shared timeout and the newest
+available one wins. Results are kept in a small JSON file for a few minutes so
+back-to-back runs do not hit the network again. Probes run on daemon
+threads, so one that hangs past the timeout is abandoned and never delays
+process exit. The probe itself is a plain
+function (init, fxx, product) -> bool, so it can be swapped for
+file_index_probe() pointing at a local copy of the NOMADS directory layout.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from pathlib import Path
+from typing import Callable
+
+import pandas as pd
+
+from gfs_cache import DEFAULT_CACHE_DIR
+from utils import file_lock, read_json, write_json_atomic
+
+ProbeFn = Callable[[str, int, str], bool]
+
+DEFAULT_PROBE_CACHE = DEFAULT_CACHE_DIR / "probes.json"
+DEFAULT_TTL_S = 300.0
+DEFAULT_TIMEOUT_S = 20.0
+
+
+def herbie_probe(init: str, fxx: int, product: str) -> bool:
+    """True if Herbie finds an index for the cycle/lead with a 2 m temperature record."""
+    from herbie import Herbie
+
+    try:
+        H = Herbie(init, model="gfs", product=product, fxx=fxx)
+        return len(H.inventory("TMP:2 m")) > 0
+    except Exception:
+        return False
+
+
+def file_index_probe(root) -> ProbeFn:
+    """Probe a local tree laid out like NOMADS: gfs.YYYYMMDD/HH/atmos/gfs.tHHz.<product>.fFFF.idx"""
+    root = Path(root)
+
+    def probe(init: str, fxx: int, product: str) -> bool:
+        t = pd.Timestamp(init)
+        hh = f"{t.hour:02d}"
+        return (root / f"gfs.{t:%Y%m%d}" / hh / "atmos" / f"gfs.t{hh}z.{product}.f{fxx:03d}.idx").exists()
+
+    return probe
+
+
+class ProbeCache:
+    """Short-lived memo of probe results shared between runs."""
+
+    def __init__(self, path=DEFAULT_PROBE_CACHE, ttl_s: float = DEFAULT_TTL_S):
+        self.path = Path(path)
+        self.ttl_s = ttl_s
+
+    @staticmethod
+    def _key(init: str, fxx: int, product: str) -> str:
+        return f"{product}|{pd.Timestamp(init):%Y-%m-%d %H:%M}|f{int(fxx):03d}"
+
+    def get(self, init: str, fxx: int, product: str) -> bool | None:
+        entry = (read_json(self.path, {}) or {}).get(self._key(init, fxx, product))
+        if entry is None or time.time() - entry["t"] > self.ttl_s:
+            return None
+        return entry["ok"]
+
+    def put(self, results: dict[str, bool], fxx: int, product: str) -> None:
+        if not results:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        now = time.time()
+        with file_lock(self.path.with_suffix(".lock")):
+            data = read_json(self.path, {}) or {}
+            data = {k: v for k, v in data.items() if now - v["t"] <= self.ttl_s}
+            for init, ok in results.items():
+                data[self._key(init, fxx, product)] = {"ok": bool(ok), "t": now}
+            write_json_atomic(self.path, data)
+
+
+def _start_probe(probe: ProbeFn, init: str, fxx: int, product: str) -> Future:
+    """Run one probe on a daemon thread (not an executor, whose workers are joined at exit)."""
+    fut = Future()
+
+    def run():
+        try:
+            fut.set_result(probe(init, fxx, product))
+        except Exception as e:
+            fut.set_exception(e)
+
+    threading.Thread(target=run, name=f"gfs-probe {init}", daemon=True).start()
+    return fut
+
+
+def newest_available(
+    candidates: list[str],
+    fxx: int,
+    product: str = "pgrb2.0p25",
+    probe: ProbeFn = herbie_probe,
+    timeout_s: float = DEFAULT_TIMEOUT_S,
+    cache: ProbeCache | None = None,
+) -> str | None:
+    """
+    First entry of candidates (ordered newest first) that is available, or None.
+    Uncached candidates are probed concurrently; a probe that has not answered
+    within timeout_s of the start counts as unavailable.
+    """
+    known = {c: cache.get(c, fxx, product) for c in candidates} if cache else {}
+    # Only cycles newer than the newest one already known to exist need probing
+    todo = []
+    for c in candidates:
+        if known.get(c) is True:
+            break
+        if known.get(c) is None:
+            todo.append(c)
+
+    fresh: dict[str, bool] = {}
+    if todo:
+        # Slow probes of older cycles are simply not waited for once a winner is known
+        futures = {c: _start_probe(probe, c, fxx, product) for c in todo}
+        deadline = time.monotonic() + timeout_s
+        for c in candidates:
+            if known.get(c) is True:
+                break
+            if c not in futures:
+                continue
+            try:
+                fresh[c] = bool(futures[c].result(timeout=max(0.0, deadline - time.monotonic())))
+            except FutureTimeout:
+                print(f"  probe {c} timed out")
+                continue  # unknown; not cached
+            except Exception:
+                fresh[c] = False
+            if fresh[c]:
+                break
+
+    if cache is not None:
+        cache.put(fresh, fxx, product)
+
+    for c in candidates:
+        if known.get(c) or fresh.get(c):
+            return c
+    return None
@@ -2,7 +2,8 @@
 from __future__ import annotations
 import argparse
 import xarray as xr
-import matplotlib.pyplot as plt
+
+from config import ensure_parent
 
 def parse_args():
     p = argparse.ArgumentParser()
@@ -11,13 +12,13 @@ def parse_args():
     p.add_argument("--out", type=str, default="reports/figures/anomaly_map.png")
     return p.parse_args()
 
-def main():
-    args = parse_args()
-    ds = xr.open_dataset(args.anoms_nc)
-    da = ds[args.var]
+def plot_anomaly_map(ds: xr.Dataset, var: str, out: str) -> None:
+    import matplotlib.pyplot as plt
+
+    da = ds[var]
 
-    # If time dimension exists, take first
-    for dim in ["time", "valid_time"]:
+    # If time/lead dimension exists, take first
+    for dim in ["time", "valid_time", "step"]:
         if dim in da.dims:
             da = da.isel({dim: 0})
 
@@ -31,12 +32,18 @@ def main():
             float(ds.latitude.min()), float(ds.latitude.max()),
         ],
     )
-    plt.colorbar(label=args.var)
+    plt.colorbar(label=var)
     plt.xlabel("Longitude")
     plt.ylabel("Latitude")
     plt.title("Forecast anomaly")
-    plt.savefig(args.out, dpi=150, bbox_inches="tight")
-    print(f"Saved map: {args.out}")
+    plt.savefig(ensure_parent(out), dpi=150, bbox_inches="tight")
+    plt.close()
+    print(f"Saved map: {out}")
+
+def main():
+    args = parse_args()
+    ds = xr.open_dataset(args.anoms_nc)
+    plot_anomaly_map(ds, args.var, args.out)
 
 if __name__ == "__main__":
     main()
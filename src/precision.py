@@ -0,0 +1,82 @@
+# src/precision.py
+"""
+Numeric precision policy for the gridded intermediates (ERA5 windows,
+climatology_doy.nc, GFS subsets and the subset cache, forecast_anoms.nc).
+
+  float64  float64 in memory, uncompressed NetCDF (the old behaviour)
+  float32  float32 compute, float32 + zlib on disk (default)
+  int16    float32 compute, CF int16 packing (scale_factor/add_offset) + zlib
+
+Feature reductions still accumulate in float64 (features._flat), so only the
+gridded fields are narrowed. Set the policy with --precision on the scripts
+that write grids, or GRID_PRECISION in the environment; check_precision_drift.py
+confirms the final features stay within tolerance of the float64 pipeline.
+"""
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import numpy as np
+import xarray as xr
+
+from config import ensure_parent
+
+POLICIES = ["float64", "float32", "int16"]
+DEFAULT_POLICY = os.environ.get("GRID_PRECISION", "float32")
+
+COMPLEVEL = 4
+PACK_FILL = np.int16(-32768)  # reserved for NaN; data packs into [-32767, 32767]
+
+
+def _check(policy: str) -> str:
+    if policy not in POLICIES:
+        raise ValueError(f"precision must be one of {POLICIES}, got '{policy}'")
+    return policy
+
+
+def compute_dtype(policy: str = DEFAULT_POLICY):
+    return np.float64 if _check(policy) == "float64" else np.float32
+
+
+def as_compute(ds: xr.Dataset, policy: str = DEFAULT_POLICY) -> xr.Dataset:
+    """Cast floating data variables (not coords) to the policy's compute dtype; lazy arrays stay lazy."""
+    dtype = compute_dtype(policy)
+    cast = {v: ds[v].astype(dtype) for v in ds.data_vars
+            if np.issubdtype(ds[v].dtype, np.floating) and ds[v].dtype != dtype}
+    return ds.assign(cast) if cast else ds
+
+
+def pack_params(values: np.ndarray) -> tuple[float, float]:
+    """(scale_factor, add_offset) mapping the finite range of values onto int16 (fill excluded)."""
+    finite = values[np.isfinite(values)]
+    if finite.size == 0:
+        return 1.0, 0.0
+    lo, hi = float(finite.min()), float(finite.max())
+    scale = (hi - lo) / (2 * 32766) or 1.0  # one step of headroom for float32 rounding
+    return scale, (hi + lo) / 2
+
+
+def encoding(ds: xr.Dataset, policy: str = DEFAULT_POLICY) -> dict:
+    """to_netcdf() encoding for the floating data variables under the policy."""
+    if _check(policy) == "float64":
+        return {}
+    enc = {}
+    for v in ds.data_vars:
+        if not np.issubdtype(ds[v].dtype, np.floating):
+            continue
+        if policy == "float32":
+            enc[v] = {"dtype": "float32", "zlib": True, "complevel": COMPLEVEL}
+        else:
+            scale, offset = pack_params(np.asarray(ds[v].values))
+            enc[v] = {"dtype": "int16", "scale_factor": np.float32(scale), "add_offset": np.float32(offset),
+                      "_FillValue": PACK_FILL, "zlib": True, "complevel": COMPLEVEL}
+    return enc
+
+
+def to_netcdf(ds: xr.Dataset, path, policy: str = DEFAULT_POLICY) -> Path:
+    """Write ds under the policy (encodings inherited from the source files are dropped)."""
+    path = ensure_parent(path)
+    ds = ds.drop_encoding()
+    ds.to_netcdf(path, encoding=encoding(ds, policy))
+    return path
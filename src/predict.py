@@ -2,55 +2,85 @@
 
 
 import joblib
+import numpy as np
 import pandas as pd
-from config import PROCESSED_DIR, MODELS_DIR, OUTPUTS_DIR
+from config import PROCESSED_DIR, MODELS_DIR, OUTPUTS_DIR, ensure_parent
+from storage import read_table
+
+# Regime labels between consecutive thresholds (len(REGIMES) == len(REGIME_QUANTILES) + 1)
+REGIME_QUANTILES = ["p50", "p75", "p90", "p95"]
+REGIMES = np.array([
+    "LOW (< P50)",
+    "TYPICAL (P50–P75)",
+    "ELEVATED (P75–P90)",
+    "HIGH (P90–P95)",
+    "EXTREME (>= P95)",
+], dtype=object)
+
+
+def load_bundle(path=MODELS_DIR / "model.joblib") -> dict:
+    return joblib.load(path)
 
-def main():
-    bundle = joblib.load(MODELS_DIR / "model.joblib")
-    model = bundle["model"]
-    feature_cols = bundle["feature_cols"]
 
-    feat = pd.read_csv(PROCESSED_DIR / "forecast_features.csv")
-    X = feat[feature_cols]
-    pred = float(model.predict(X)[0])
+def load_thresholds(bundle: dict | None = None, model_table=PROCESSED_DIR / "model_table.parquet") -> dict:
+    """Regime thresholds saved with the model by train.py; older bundles fall back to the model table."""
+    if bundle is not None and "thresholds" in bundle:
+        return dict(bundle["thresholds"])
+    print("Model bundle has no thresholds (retrain to store them); reading the model table.")
 
-    # Load historical target distribution for context
-    hist = pd.read_csv(PROCESSED_DIR / "model_table.csv")
+    # Load historical target distribution for context (target column only)
+    hist = read_table(model_table, "model_table", columns=["target_next_absret"])
     y = hist["target_next_absret"].dropna()
 
-    p50 = float(y.quantile(0.50))
-    p75 = float(y.quantile(0.75))
-    p90 = float(y.quantile(0.90))
-    p95 = float(y.quantile(0.95))
-
-    # Regime label
-    if pred >= p95:
-        label = "EXTREME (>= P95)"
-    elif pred >= p90:
-        label = "HIGH (P90–P95)"
-    elif pred >= p75:
-        label = "ELEVATED (P75–P90)"
-    elif pred >= p50:
-        label = "TYPICAL (P50–P75)"
-    else:
-        label = "LOW (< P50)"
+    return {
+        "p50": float(y.quantile(0.50)),
+        "p75": float(y.quantile(0.75)),
+        "p90": float(y.quantile(0.90)),
+        "p95": float(y.quantile(0.95)),
+    }
+
+
+def target_quantile(bundle: dict, q):
+    """Historical target quantile(s) q in [0, 1], interpolated from the sketch in the bundle."""
+    sketch = bundle["target_sketch"]
+    return np.interp(q, sketch["probs"], sketch["values"])
+
+
+def regime_labels(pred, thresholds: dict) -> np.ndarray:
+    """Regime label per prediction: pred >= P95 is EXTREME, ..., pred < P50 is LOW."""
+    edges = np.array([thresholds[q] for q in REGIME_QUANTILES], dtype=float)
+    return REGIMES[np.searchsorted(edges, np.asarray(pred, dtype=float), side="right")]
+
+
+def predict_features(feat: pd.DataFrame, bundle: dict, thresholds: dict) -> pd.DataFrame:
+    """Score every row in one call; output sorted by (valid_date, lead_h) when present."""
+    model = bundle["model"]
+    feature_cols = bundle["feature_cols"]
+
+    pred = np.asarray(model.predict(feat[feature_cols]), dtype=float)
 
     out = feat.copy()
     out["pred_next_absret"] = pred
     out["pred_next_absret_pct"] = pred * 100.0
-    out["vol_regime"] = label
+    out["vol_regime"] = regime_labels(pred, thresholds)
+
+    for q in REGIME_QUANTILES:
+        out[f"hist_{q}"] = thresholds[q]
 
-    out["hist_p50"] = p50
-    out["hist_p75"] = p75
-    out["hist_p90"] = p90
-    out["hist_p95"] = p95
+    keys = [c for c in ("valid_date", "lead_h") if c in out.columns]
+    if keys:
+        out = out.sort_values(keys, kind="stable")
+    return out.reset_index(drop=True)
 
-    out_path = OUTPUTS_DIR / "volatility_forecast.csv"
+
+def write_outputs(out: pd.DataFrame, outputs_dir=OUTPUTS_DIR) -> None:
+    out_path = ensure_parent(outputs_dir / "volatility_forecast.csv")
     out.to_csv(out_path, index=False)
     print(f"Saved forecast to {out_path}")
 
-        # --- Executive summary ---
-    valid_date = out.loc[0, "valid_date"] if "valid_date" in out.columns else "N/A"
+    # --- Executive summary ---
+    valid_date = pd.Timestamp(out.loc[0, "valid_date"]).date() if "valid_date" in out.columns else "N/A"
+    pred = float(out.loc[0, "pred_next_absret"])
     pred_pct = float(out.loc[0, "pred_next_absret_pct"])
     regime = out.loc[0, "vol_regime"]
 
@@ -63,6 +93,14 @@ def main():
     lines.append(f"Forecast date: {valid_date}")
     lines.append(f"Predicted next-day abs move: {pred_pct:.2f}%")
     lines.append(f"Volatility regime: {regime}")
+    if len(out) > 1:
+        lines.append("")
+        lines.append("Outlook by lead:")
+        dates = pd.to_datetime(out["valid_date"]).dt.date if "valid_date" in out.columns else ["N/A"] * len(out)
+        leads = out["lead_h"] if "lead_h" in out.columns else [None] * len(out)
+        for d, h, pct, r in zip(dates, leads, out["pred_next_absret_pct"], out["vol_regime"]):
+            lead = f" (+{int(h)}h)" if h is not None else ""
+            lines.append(f" - {d}{lead}: {pct:.2f}% → {r}")
     lines.append("")
     lines.append("Weather anomaly drivers (region):")
     if tmean is not None:
@@ -78,7 +116,7 @@ def main():
 
     summary_text = "\n".join(lines)
 
-    summary_path = OUTPUTS_DIR / "summary.txt"
+    summary_path = outputs_dir / "summary.txt"
     with open(summary_path, "w", encoding="utf-8") as f:
         f.write(summary_text)
 
@@ -88,10 +126,18 @@ def main():
 
     # Also print a friendly one-liner
     if "valid_date" in out.columns:
-        vd = out.loc[0, "valid_date"]
-        print(f"Forecast for {vd}: {pred*100:.2f}% abs move → {label}")
+        print(f"Forecast for {valid_date}: {pred*100:.2f}% abs move → {regime}")
     else:
-        print(f"Forecast: {pred*100:.2f}% abs move → {label}")
+        print(f"Forecast: {pred*100:.2f}% abs move → {regime}")
+
+
+def main():
+    bundle = load_bundle()
+    thresholds = load_thresholds(bundle)
+
+    feat = read_table(PROCESSED_DIR / "forecast_features.parquet", "forecast_features")
+    out = predict_features(feat, bundle, thresholds)
+    write_outputs(out)
 
 if __name__ == "__main__":
     main()
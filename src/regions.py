@@ -0,0 +1,161 @@
+# src/regions.py
+"""
+Region definitions and area-weighted region masks.
+
+A region is a lat/lon box or a lon/lat polygon. RegionMask rasterizes a set
+of regions onto a grid once, as a sparse (n_regions, n_cells) matrix of
+cos(latitude) area weights, so every region's sums come out of one matrix
+product over a block of fields (see features._region_block_stats). Regions may
+overlap (e.g. PJM and MISO); label_raster() gives the first region per cell
+for maps.
+
+Regions are picked by name from DEFAULT_REGIONS, or loaded from a JSON file:
+
+    {"houston": {"box": [28.5, 31.0, -96.5, -94.0]},
+     "tri":     {"polygon": [[-100, 30], [-95, 30], [-97.5, 34]]}}
+
+with box = [south, north, west, east] and polygon vertices as [lon, lat],
+longitudes in -180..180.
+"""
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+class Region(NamedTuple):
+    name: str
+    box: tuple[float, float, float, float] | None = None  # south, north, west, east
+    polygon: tuple[tuple[float, float], ...] | None = None  # (lon, lat) vertices
+
+    def bounds(self) -> tuple[float, float, float, float]:
+        if self.box is not None:
+            return self.box
+        lon, lat = np.asarray(self.polygon, dtype=float).T
+        return float(lat.min()), float(lat.max()), float(lon.min()), float(lon.max())
+
+    def contains(self, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        """Boolean mask of the points (lat, lon) inside the region (edges included for boxes)."""
+        if self.box is not None:
+            s, n, w, e = self.box
+            return (lat >= s) & (lat <= n) & (lon >= w) & (lon <= e)
+        # Even-odd ray casting, vectorized over points
+        px, py = np.asarray(self.polygon, dtype=float).T
+        inside = np.zeros(np.shape(lat), dtype=bool)
+        for x0, y0, x1, y1 in zip(px, py, np.roll(px, -1), np.roll(py, -1)):
+            crosses = (y0 > lat) != (y1 > lat)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                x_cross = x0 + (lat - y0) * (x1 - x0) / (y1 - y0)
+            inside ^= crosses & (lon < x_cross)
+        return inside
+
+
+# Approximate footprints of the traded power regions; "ercot" is the original project box.
+DEFAULT_REGIONS = {
+    "ercot": Region("ercot", box=(25.0, 37.0, -107.0, -93.0)),
+    "spp": Region("spp", box=(31.0, 49.0, -104.0, -94.0)),
+    "miso": Region("miso", box=(29.0, 49.0, -97.5, -84.0)),
+    "pjm": Region("pjm", box=(36.0, 42.5, -90.5, -74.0)),
+    "nyiso": Region("nyiso", box=(40.5, 45.0, -79.8, -71.8)),
+    "isone": Region("isone", box=(41.0, 47.5, -73.7, -67.0)),
+    "caiso": Region("caiso", box=(32.5, 42.0, -124.5, -114.0)),
+}
+
+
+def load_regions(path) -> dict[str, Region]:
+    spec = json.loads(Path(path).read_text())
+    out = {}
+    for name, d in spec.items():
+        if "box" in d:
+            out[name] = Region(name, box=tuple(float(x) for x in d["box"]))
+        elif "polygon" in d:
+            out[name] = Region(name, polygon=tuple((float(x), float(y)) for x, y in d["polygon"]))
+        else:
+            raise ValueError(f"Region '{name}' in {path} needs a 'box' or a 'polygon'.")
+    return out
+
+
+def region_spec(regions: dict[str, Region]) -> dict:
+    """JSON-ready definitions, in the load_regions() file format."""
+    return {n: {"box": list(r.box)} if r.box is not None else {"polygon": [list(v) for v in r.polygon]}
+            for n, r in regions.items()}
+
+
+def resolve_regions(specs: list[str]) -> dict[str, Region]:
+    """Regions from a list of default names, 'all', and/or JSON files."""
+    out = {}
+    for s in specs:
+        if s == "all":
+            out.update(DEFAULT_REGIONS)
+        elif s in DEFAULT_REGIONS:
+            out[s] = DEFAULT_REGIONS[s]
+        elif s.endswith(".json"):
+            out.update(load_regions(s))
+        else:
+            raise ValueError(f"Unknown region '{s}'. Known: {sorted(DEFAULT_REGIONS)} or a .json file.")
+    return out
+
+
+def domain_box(regions: dict[str, Region], pad: float = 0.5) -> dict[str, float]:
+    """One south/north/west/east box covering every region (the download domain)."""
+    b = np.array([r.bounds() for r in regions.values()])
+    return dict(south=float(b[:, 0].min() - pad), north=float(b[:, 1].max() + pad),
+                west=float(b[:, 2].min() - pad), east=float(b[:, 3].max() + pad))
+
+
+class RegionMask:
+    """
+    Regions rasterized on a (latitude, longitude) grid. Only cells inside some
+    region are kept (`cells`, flat indices); `weights` is the sparse
+    (n_regions, len(cells)) cos-latitude matrix and `members[r]` the positions
+    of region r's cells within `cells`.
+    """
+
+    def __init__(self, regions: dict[str, Region], latitude, longitude):
+        lat = np.asarray(latitude, dtype=float)
+        lon = (np.asarray(longitude, dtype=float) + 180.0) % 360.0 - 180.0
+        LAT, LON = np.meshgrid(lat, lon, indexing="ij")
+        self.names = list(regions)
+        self.shape = LAT.shape
+
+        inside = np.stack([r.contains(LAT, LON).ravel() for r in regions.values()])
+        empty = [n for n, m in zip(self.names, inside) if not m.any()]
+        if empty:
+            raise ValueError(f"Regions {empty} have no grid cells; is the domain large enough?")
+
+        self.cells = np.flatnonzero(inside.any(axis=0))
+        inside = inside[:, self.cells]
+        area = np.cos(np.deg2rad(LAT.ravel()[self.cells]))
+        rows, cols = np.nonzero(inside)
+        self.weights = sparse.csr_matrix((area[cols], (rows, cols)), shape=inside.shape)
+        self.total = np.asarray(self.weights.sum(axis=1)).ravel()
+        self.members = [np.flatnonzero(m) for m in inside]
+
+    def wsum(self, a: np.ndarray) -> np.ndarray:
+        """Area-weighted sums of a (k, len(cells)) block per region -> (k, n_regions)."""
+        return np.asarray(self.weights @ a.T).T
+
+    def label_raster(self) -> np.ndarray:
+        """(lat, lon) int labels: index of the first region containing the cell, -1 outside."""
+        labels = np.full(self.shape[0] * self.shape[1], -1, dtype=np.int64)
+        for r in reversed(range(len(self.names))):
+            labels[self.cells[self.members[r]]] = r
+        return labels.reshape(self.shape)
+
+
+def long_frame(feats: dict[str, np.ndarray], names: list[str], keys: dict) -> pd.DataFrame:
+    """
+    Features shaped (n, n_regions) -> one row per (row, region), with the
+    per-row key columns in `keys` repeated for every region.
+    """
+    n = len(next(iter(feats.values())))
+    out = pd.DataFrame({k: np.repeat(np.asarray(v), len(names)) for k, v in keys.items()})
+    out["region"] = np.tile(np.asarray(names, dtype=object), n)
+    for c, a in feats.items():
+        out[c] = np.asarray(a).reshape(-1)
+    return out
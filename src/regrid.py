@@ -0,0 +1,124 @@
+# src/regrid.py
+"""
+Bilinear regridding with cached sparse weights.
+
+The weights from a source lat/lon grid to a target grid are built once,
+stored as a sparse (n_target, n_source) matrix keyed by a hash of both grids,
+and reused across variables and runs. Matches xarray's
+.interp(latitude=..., longitude=...) for rectilinear grids: points outside
+the source grid come back as NaN.
+"""
+from __future__ import annotations
+
+import hashlib
+from pathlib import Path
+
+import numpy as np
+import xarray as xr
+from scipy import sparse
+
+from config import PROCESSED_DIR
+
+DEFAULT_CACHE_DIR = PROCESSED_DIR / "regrid_cache"
+
+# In-process cache: key -> (weights, valid target mask)
+_MEMO: dict[str, tuple[sparse.csr_matrix, np.ndarray]] = {}
+
+
+def grid_key(src_lat, src_lon, dst_lat, dst_lon) -> str:
+    h = hashlib.sha256(b"bilinear-v1")
+    for a in (src_lat, src_lon, dst_lat, dst_lon):
+        a = np.ascontiguousarray(a, dtype=np.float64)
+        h.update(str(a.shape).encode())
+        h.update(a.tobytes())
+    return h.hexdigest()[:32]
+
+
+def _axis_weights(src: np.ndarray, dst: np.ndarray):
+    """
+    For each dst point: (lower index, upper index, upper weight, inside) on a
+    1-D source axis that may be ascending or descending.
+    """
+    src = np.asarray(src, dtype=np.float64)
+    dst = np.asarray(dst, dtype=np.float64)
+    order = np.argsort(src)
+    s = src[order]
+    inside = (dst >= s[0]) & (dst <= s[-1])
+
+    j = np.clip(np.searchsorted(s, dst, side="right") - 1, 0, len(s) - 2)
+    w = (dst - s[j]) / (s[j + 1] - s[j])
+    return order[j], order[j + 1], np.where(inside, w, 0.0), inside
+
+
+def bilinear_weights(src_lat, src_lon, dst_lat, dst_lon) -> tuple[sparse.csr_matrix, np.ndarray]:
+    """Sparse weights mapping flattened (lat, lon) source to flattened target, plus target validity."""
+    nx_src = len(src_lon)
+    ylo, yhi, wy, iny = _axis_weights(src_lat, dst_lat)
+    xlo, xhi, wx, inx = _axis_weights(src_lon, dst_lon)
+
+    ny, nx = len(dst_lat), len(dst_lon)
+    rows = np.arange(ny * nx).reshape(ny, nx)
+    cols, vals = [], []
+    for yi, fy in ((ylo, 1.0 - wy), (yhi, wy)):
+        for xi, fx in ((xlo, 1.0 - wx), (xhi, wx)):
+            cols.append((yi[:, None] * nx_src + xi[None, :]).ravel())
+            vals.append((fy[:, None] * fx[None, :]).ravel())
+
+    W = sparse.csr_matrix(
+        (np.concatenate(vals), (np.tile(rows.ravel(), 4), np.concatenate(cols))),
+        shape=(ny * nx, len(src_lat) * nx_src),
+    )
+    W.eliminate_zeros()
+    valid = (iny[:, None] & inx[None, :]).ravel()
+    return W, valid
+
+
+def get_weights(src_lat, src_lon, dst_lat, dst_lon, cache_dir: Path | None = DEFAULT_CACHE_DIR):
+    """Weights from memory, then disk, else build them (and save to disk)."""
+    key = grid_key(src_lat, src_lon, dst_lat, dst_lon)
+    if key in _MEMO:
+        return _MEMO[key]
+
+    path = Path(cache_dir) / f"bilinear_{key}.npz" if cache_dir else None
+    if path is not None and path.exists():
+        z = np.load(path)
+        W = sparse.csr_matrix((z["data"], z["indices"], z["indptr"]), shape=tuple(z["shape"]))
+        valid = z["valid"]
+    else:
+        W, valid = bilinear_weights(src_lat, src_lon, dst_lat, dst_lon)
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(path.stem + ".tmp.npz")
+            np.savez(tmp, data=W.data, indices=W.indices, indptr=W.indptr,
+                     shape=np.array(W.shape), valid=valid)
+            tmp.replace(path)
+
+    _MEMO[key] = (W, valid)
+    return W, valid
+
+
+def regrid(src: xr.Dataset, latitude: xr.DataArray, longitude: xr.DataArray,
+           cache_dir: Path | None = DEFAULT_CACHE_DIR) -> xr.Dataset:
+    """
+    Regrid every (latitude, longitude) variable of src onto the target
+    coordinates with one sparse matmul for all variables.
+    """
+    names = list(src.data_vars)
+    extra = {d for v in names for d in src[v].dims} - {"latitude", "longitude"}
+    if extra:
+        raise ValueError(f"regrid expects (latitude, longitude) fields; select {sorted(extra)} first.")
+    src = src.transpose("latitude", "longitude")
+    W, valid = get_weights(src["latitude"].values, src["longitude"].values,
+                           latitude.values, longitude.values, cache_dir=cache_dir)
+
+    # (n_source, n_vars) -> (n_target, n_vars)
+    X = np.stack([src[v].values.reshape(-1) for v in names], axis=1).astype(np.float64)
+    Y = W @ X
+    Y[~valid] = np.nan
+
+    shape = (latitude.size, longitude.size)
+    coords = {"latitude": latitude.values, "longitude": longitude.values}
+    return xr.Dataset(
+        {v: (("latitude", "longitude"), Y[:, k].reshape(shape)) for k, v in enumerate(names)},
+        coords=coords,
+    )
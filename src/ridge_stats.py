@@ -0,0 +1,174 @@
+# src/ridge_stats.py
+"""
+StandardScaler + Ridge from sufficient statistics.
+
+RidgeStats keeps prefix sums of x, y, x xᵀ and x y over date-ordered rows.
+Any contiguous window [start, end) - expanding or rolling - then gives the
+scaler mean/std and the centered normal equations without touching the rows
+again, so a fit costs O(p³) and appending a day costs O(p²). fit() accepts
+arrays of window bounds and solves all windows in one batched call, which is
+what makes per-day walk-forward refits cheap.
+
+Results match Pipeline([StandardScaler(), Ridge(alpha)]) fitted on the same
+rows; to_pipeline() builds that fitted pipeline for the model bundle.
+fit_path() eigendecomposes each window's standardized Gram matrix once so a
+whole grid of alphas can be scored for the price of one fit.
+"""
+from __future__ import annotations
+
+from typing import NamedTuple
+
+import numpy as np
+
+
+class RidgeFit(NamedTuple):
+    """Fitted window(s); leading axis is the window when fitted in batch."""
+    mean: np.ndarray       # scaler mean
+    var: np.ndarray        # scaler variance (ddof=0)
+    scale: np.ndarray      # scaler scale (std, 1 where constant)
+    coef_z: np.ndarray     # ridge coefficients on standardized features
+    intercept: np.ndarray  # ridge intercept (= window mean of y)
+    n: np.ndarray          # rows in the window
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return ((np.asarray(X, dtype=float) - self.mean) / self.scale) @ self.coef_z + self.intercept
+
+
+class RidgePath(NamedTuple):
+    """Per-window eigendecomposition of the standardized normal equations."""
+    mean: np.ndarray       # (k, p)
+    scale: np.ndarray      # (k, p)
+    eigvals: np.ndarray    # (k, p)
+    eigvecs: np.ndarray    # (k, p, p)
+    proj: np.ndarray       # (k, p) eigvecsᵀ Zᵀy
+    intercept: np.ndarray  # (k,)
+
+
+def predict_path(path: RidgePath, X: np.ndarray, window: np.ndarray, alphas) -> np.ndarray:
+    """(n_rows, n_alphas) predictions; row i uses window[i] and every alpha."""
+    alphas = np.asarray(alphas, dtype=float)
+    Z = (np.asarray(X, dtype=float) - path.mean[window]) / path.scale[window]
+    ZV = np.einsum("ip,ipq->iq", Z, path.eigvecs[window])
+    shrink = path.proj[window][:, :, None] / (path.eigvals[window][:, :, None] + alphas)
+    return np.einsum("iq,iqa->ia", ZV, shrink) + path.intercept[window][:, None]
+
+
+def predict_rows(fit: RidgeFit, X: np.ndarray, window: np.ndarray) -> np.ndarray:
+    """Predict each row of X with the batched fit at index window[i]."""
+    Z = (np.asarray(X, dtype=float) - fit.mean[window]) / fit.scale[window]
+    return np.einsum("ij,ij->i", Z, fit.coef_z[window]) + fit.intercept[window]
+
+
+def _zero_scale_to_one(scale: np.ndarray) -> np.ndarray:
+    # Same rule as sklearn's StandardScaler for (near-)constant features
+    return np.where(scale < 10 * np.finfo(scale.dtype).eps, 1.0, scale)
+
+
+class RidgeStats:
+    def __init__(self, X, y, dates=None, shift: tuple | None = None):
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        y = np.asarray(y, dtype=float)
+        self.p = X.shape[1]
+        # Sums are taken around a fixed shift (the first batch's means) to keep
+        # the window-centered moments accurate; any shift gives the same fit.
+        if shift is None:
+            shift = (X.mean(axis=0) if len(X) else np.zeros(self.p), float(y.mean()) if len(y) else 0.0)
+        self.x_shift, self.y_shift = np.asarray(shift[0], dtype=float), float(shift[1])
+
+        self.n = 0
+        self._alloc(max(len(X), 16))
+        self.dates = np.empty(0, dtype="datetime64[ns]")
+        self.append(X, y, dates)
+
+    def _alloc(self, cap: int) -> None:
+        p = self.p
+        old = getattr(self, "Sx", None)
+        Sx, Sy = np.zeros((cap + 1, p)), np.zeros(cap + 1)
+        Sxx, Sxy = np.zeros((cap + 1, p, p)), np.zeros((cap + 1, p))
+        if old is not None:
+            k = self.n + 1
+            Sx[:k], Sy[:k], Sxx[:k], Sxy[:k] = self.Sx[:k], self.Sy[:k], self.Sxx[:k], self.Sxy[:k]
+        self.Sx, self.Sy, self.Sxx, self.Sxy = Sx, Sy, Sxx, Sxy
+
+    def append(self, X, y, dates=None) -> "RidgeStats":
+        """Add rows (dated after the existing ones) in O(k p²)."""
+        X = np.atleast_2d(np.asarray(X, dtype=float)) - self.x_shift
+        y = np.atleast_1d(np.asarray(y, dtype=float)) - self.y_shift
+        k = len(y)
+        if k == 0:
+            return self
+        if self.n + k > len(self.Sy) - 1:
+            self._alloc(max(2 * (len(self.Sy) - 1), self.n + k))
+        a, b = self.n, self.n + k
+        self.Sx[a + 1:b + 1] = self.Sx[a] + np.cumsum(X, axis=0)
+        self.Sy[a + 1:b + 1] = self.Sy[a] + np.cumsum(y)
+        self.Sxx[a + 1:b + 1] = self.Sxx[a] + np.cumsum(X[:, :, None] * X[:, None, :], axis=0)
+        self.Sxy[a + 1:b + 1] = self.Sxy[a] + np.cumsum(X * y[:, None], axis=0)
+        self.n = b
+        if dates is not None:
+            self.dates = np.concatenate([self.dates, np.asarray(dates, dtype="datetime64[ns]")])
+        return self
+
+    def row_at(self, date, side: str = "left") -> int:
+        """Row index of date in the dated rows (for date-keyed windows)."""
+        return int(np.searchsorted(self.dates, np.datetime64(date, "ns"), side=side))
+
+    def _moments(self, start, end):
+        """Window means, standardized Gram matrix and Zᵀy for the window(s) [start, end)."""
+        a = np.asarray(start, dtype=np.int64)
+        b = np.asarray(end, dtype=np.int64)
+        if np.any(b - a < 1) or np.any(b > self.n) or np.any(a < 0):
+            raise ValueError("Each window needs 1 <= rows and must lie inside the data.")
+        m = (b - a).astype(float)
+        mx = (self.Sx[b] - self.Sx[a]) / m[..., None]
+        my = (self.Sy[b] - self.Sy[a]) / m
+        C = (self.Sxx[b] - self.Sxx[a]) - m[..., None, None] * mx[..., :, None] * mx[..., None, :]
+        c = (self.Sxy[b] - self.Sxy[a]) - m[..., None] * mx * my[..., None]
+
+        var = np.maximum(np.diagonal(C, axis1=-2, axis2=-1) / m[..., None], 0.0)
+        scale = _zero_scale_to_one(np.sqrt(var))
+        G = C / (scale[..., :, None] * scale[..., None, :])
+        return m, mx + self.x_shift, my + self.y_shift, var, scale, G, c / scale
+
+    def fit(self, start, end, alpha: float = 1.0) -> RidgeFit:
+        """Fit the window(s) [start, end); scalar bounds give one fit, arrays a batch."""
+        m, mean, ybar, var, scale, G, r = self._moments(start, end)
+        coef_z = np.linalg.solve(G + alpha * np.eye(self.p), r[..., None])[..., 0]
+        return RidgeFit(mean, var, scale, coef_z, ybar, m)
+
+    def fit_path(self, start, end) -> RidgePath:
+        """Eigendecompose each window once; see predict_path() for any alpha grid."""
+        _, mean, ybar, _, scale, G, r = self._moments(np.atleast_1d(start), np.atleast_1d(end))
+        lam, V = np.linalg.eigh(G)
+        return RidgePath(mean, scale, np.maximum(lam, 0.0), V, np.einsum("kpq,kp->kq", V, r), ybar)
+
+
+def to_pipeline(fit: RidgeFit, feature_cols: list[str], alpha: float):
+    """A fitted Pipeline([StandardScaler, Ridge]) carrying one window's fit."""
+    from sklearn.linear_model import Ridge
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    scaler = StandardScaler()
+    scaler.mean_, scaler.var_, scaler.scale_ = fit.mean, fit.var, fit.scale
+    scaler.n_samples_seen_ = int(fit.n)
+    scaler.n_features_in_ = len(feature_cols)
+    scaler.feature_names_in_ = np.asarray(feature_cols, dtype=object)
+
+    reg = Ridge(alpha=alpha)
+    reg.coef_, reg.intercept_ = fit.coef_z, float(fit.intercept)
+    reg.n_features_in_ = len(feature_cols)
+    return Pipeline([("scaler", scaler), ("reg", reg)])
+
+
+def ridge_alpha(model) -> float | None:
+    """alpha if model is Pipeline([StandardScaler, Ridge]) with defaults this engine reproduces, else None."""
+    steps = getattr(model, "steps", None)
+    if not steps or len(steps) != 2:
+        return None
+    scaler, reg = steps[0][1], steps[1][1]
+    if type(scaler).__name__ != "StandardScaler" or type(reg).__name__ != "Ridge":
+        return None
+    if not (scaler.with_mean and scaler.with_std and reg.fit_intercept and np.ndim(reg.alpha) == 0):
+        return None
+    return float(reg.alpha)
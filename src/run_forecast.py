@@ -3,6 +3,7 @@ from __future__ import annotations
 import argparse
 import subprocess
 import sys
+import time
 from pathlib import Path
 
 
@@ -16,11 +17,83 @@ def run(cmd: list[str]) -> None:
 def parse_args():
     p = argparse.ArgumentParser(description="End-to-end forecast run: GFS → anomalies → map → features → prediction.")
     p.add_argument("--fxx", type=int, default=24, help="Forecast lead hours (24 = tomorrow).")
+    p.add_argument("--fxx_range", type=int, nargs=3, metavar=("START", "END", "STEP"), default=None,
+                   help="Multi-lead outlook: score every lead in [START, END] by STEP (overrides --fxx).")
     p.add_argument("--init", type=str, default=None, help="Optional init time UTC like '2025-12-25 18:00'.")
     p.add_argument("--map_out", type=str, default="reports/figures/anom_t2m.png")
+    p.add_argument("--clim_nc", type=str, default="data/processed/climatology_doy.nc")
+    p.add_argument("--in_process", action="store_true",
+                   help="Run all stages in this interpreter, passing datasets in memory.")
+    p.add_argument("--write_artifacts", action="store_true",
+                   help="With --in_process: also write gfs_subset.nc, forecast_anoms.nc and forecast_features.parquet.")
     return p.parse_args()
 
 
+def _timed(name: str, t0: float) -> float:
+    t1 = time.perf_counter()
+    print(f"  {name}: {t1 - t0:.2f}s")
+    return t1
+
+
+def run_in_process(args) -> None:
+    # Stage modules sit next to this file; import them here so the
+    # subprocess mode does not pay for xarray/sklearn/matplotlib.
+    import xarray as xr
+    import build_forecast_climatology
+    import compute_forecast_anomalies
+    import extract_forecast_features
+    import get_gfs_forecast
+    import make_anomaly_map
+    import precision
+    import predict
+    from storage import write_table
+
+    t = time.perf_counter()
+
+    # Load once: climatology, model bundle and regime thresholds
+    clim = xr.open_dataset(args.clim_nc).load()
+    bundle = predict.load_bundle()
+    thresholds = predict.load_thresholds(bundle)
+    t = _timed("load climatology + model", t)
+
+    # 1) Download / subset forecast (reuses the local GFS subset cache)
+    fetch_opts = dict(cache=get_gfs_forecast.SubsetCache(),
+                      probe_opts={"probe_cache": get_gfs_forecast.ProbeCache()})
+    if args.fxx_range:
+        start, end, step = args.fxx_range
+        fc = get_gfs_forecast.fetch_leads(list(range(start, end + 1, step)), init=args.init, **fetch_opts)
+    else:
+        fc = get_gfs_forecast.fetch_subset(args.init, fxx=args.fxx, **fetch_opts).load()
+    t = _timed("get_gfs_forecast", t)
+
+    # Forecast-grid climatology store, if built and current for this grid
+    store = build_forecast_climatology.open_store(
+        build_forecast_climatology.DEFAULT_STORE, args.clim_nc, fc["latitude"], fc["longitude"])
+
+    # 2) Compute anomalies
+    anoms = compute_forecast_anomalies.compute_anomalies(fc, clim, clim_store=store)
+    t = _timed("compute_forecast_anomalies", t)
+
+    # 3) Make anomaly map
+    make_anomaly_map.plot_anomaly_map(anoms, "t2m_anom_c", args.map_out)
+    t = _timed("make_anomaly_map", t)
+
+    # 4) Extract forecast features
+    feat = extract_forecast_features.extract_features(anoms, clim, clim_store=store)
+    t = _timed("extract_forecast_features", t)
+
+    # 5) Predict volatility + regime label (all leads in one call)
+    out = predict.predict_features(feat, bundle, thresholds)
+    predict.write_outputs(out)
+    t = _timed("predict", t)
+
+    if args.write_artifacts:
+        precision.to_netcdf(fc, "data/processed/gfs_subset.nc")
+        precision.to_netcdf(anoms, "data/processed/forecast_anoms.nc")
+        write_table(feat, "data/processed/forecast_features.parquet", "forecast_features")
+        _timed("write artifacts", t)
+
+
 def main():
     args = parse_args()
 
@@ -29,8 +102,15 @@ def main():
     Path("reports/figures").mkdir(parents=True, exist_ok=True)
     Path("outputs").mkdir(parents=True, exist_ok=True)
 
+    if args.in_process:
+        run_in_process(args)
+        print("\n✅ Done.")
+        return
+
     # 1) Download / subset forecast
     cmd = [sys.executable, "src/get_gfs_forecast.py", "--fxx", str(args.fxx), "--out", "data/processed/gfs_subset.nc"]
+    if args.fxx_range:
+        cmd += ["--fxx_range", *map(str, args.fxx_range)]
     if args.init:
         cmd += ["--init", args.init]
     run(cmd)
@@ -38,7 +118,7 @@ def main():
     # 2) Compute anomalies (uses climatology_doy.nc)
     run([sys.executable, "src/compute_forecast_anomalies.py",
          "--forecast_nc", "data/processed/gfs_subset.nc",
-         "--clim_nc", "data/processed/climatology_doy.nc",
+         "--clim_nc", args.clim_nc,
          "--out", "data/processed/forecast_anoms.nc"])
 
     # 3) Make anomaly map
@@ -50,7 +130,8 @@ def main():
     # 4) Extract forecast features
     run([sys.executable, "src/extract_forecast_features.py",
          "--anoms_nc", "data/processed/forecast_anoms.nc",
-         "--out", "data/processed/forecast_features.csv"])
+         "--clim_nc", args.clim_nc,
+         "--out", "data/processed/forecast_features.parquet"])
 
     # 5) Predict volatility + regime label
     run([sys.executable, "src/predict.py"])
@@ -58,7 +139,7 @@ def main():
     print("\n✅ Done.")
     print("Artifacts:")
     print(" - reports/figures/anom_t2m.png")
-    print(" - data/processed/forecast_features.csv")
+    print(" - data/processed/forecast_features.parquet")
     print(" - outputs/volatility_forecast.csv")
 
 
@@ -0,0 +1,230 @@
+# src/serve.py
+"""
+Resident prediction service on localhost.
+
+Keeps the model bundle, regime thresholds, climatology, forecast-grid
+climatology stores and regrid weights in memory, so re-scoring a cycle only
+pays for the GFS fetch (itself cached) and the feature pass.
+
+    python src/serve.py --port 8765
+
+    POST /predict  {"init": "2025-07-14 18:00", "fxx": 24}
+                   {"init": "...", "fxx_range": [0, 72, 12]}
+                   {"subset_nc": "data/processed/gfs_subset.nc"}  (must be under --data_dir)
+         -> {"rows": [{features..., valid_date, lead_h, pred_next_absret, vol_regime, ...}],
+             "timings_s": {...}}
+    POST /reload   reload model bundle and climatology from disk (requests in
+                   flight finish on the state they started with)
+    GET  /health
+    GET  /metrics  request/error counts and latency percentiles per endpoint
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+import xarray as xr
+
+import build_forecast_climatology
+import compute_forecast_anomalies
+import extract_forecast_features
+import get_gfs_forecast
+import predict
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Serve volatility predictions with warm model/climatology state.")
+    p.add_argument("--host", type=str, default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--clim_nc", type=str, default="data/processed/climatology_doy.nc")
+    p.add_argument("--clim_store", type=str, default=build_forecast_climatology.DEFAULT_STORE)
+    p.add_argument("--workers", type=int, default=8, help="Concurrent lead downloads for fxx_range requests.")
+    p.add_argument("--data_dir", type=str, default="data",
+                   help="Directory that subset_nc paths in requests must be inside.")
+    return p.parse_args()
+
+
+class State(NamedTuple):
+    """Everything /reload replaces; a request uses one snapshot throughout."""
+    clim: xr.Dataset
+    bundle: dict
+    thresholds: dict
+    stores: build_forecast_climatology.StoreCache
+
+
+class Predictor:
+    """Warm pipeline state: GFS subset -> anomalies -> features -> prediction."""
+
+    def __init__(self, clim_nc: str, clim_store: str, workers: int = 8, data_dir: str = "data"):
+        self.clim_nc = clim_nc
+        self.clim_store = clim_store
+        self.workers = workers
+        self.data_dir = Path(data_dir).resolve()
+        self.subset_cache = get_gfs_forecast.SubsetCache()
+        self.probe_opts = {"probe_cache": get_gfs_forecast.ProbeCache()}
+        self.lock = threading.Lock()
+        self.reload()
+
+    def reload(self) -> None:
+        clim = xr.open_dataset(self.clim_nc).load()
+        bundle = predict.load_bundle()
+        stores = build_forecast_climatology.StoreCache(self.clim_store, self.clim_nc, clim)
+        state = State(clim, bundle, predict.load_thresholds(bundle), stores)
+        with self.lock:
+            self.state = state
+
+    def snapshot(self) -> State:
+        with self.lock:
+            return self.state
+
+    def subset_path(self, path: str) -> Path:
+        """Resolve a requested subset_nc, refusing anything outside data_dir."""
+        p = Path(path).resolve()
+        if not p.is_relative_to(self.data_dir):
+            raise ValueError(f"subset_nc must be inside {self.data_dir}")
+        return p
+
+    def fetch(self, req: dict) -> xr.Dataset:
+        if req.get("subset_nc"):
+            with xr.open_dataset(self.subset_path(req["subset_nc"])) as ds:
+                return ds.load()
+        opts = dict(cache=self.subset_cache, probe_opts=self.probe_opts)
+        if req.get("fxx_range"):
+            start, end, step = (int(x) for x in req["fxx_range"])
+            return get_gfs_forecast.fetch_leads(list(range(start, end + 1, step)), init=req.get("init"),
+                                                workers=self.workers, **opts)
+        return get_gfs_forecast.fetch_subset(req.get("init"), fxx=int(req.get("fxx", 24)), **opts).load()
+
+    def score(self, fc: xr.Dataset, timings: dict):
+        t = time.perf_counter()
+        state = self.snapshot()
+        store = state.stores.get(fc["latitude"], fc["longitude"])
+        anoms = compute_forecast_anomalies.compute_anomalies(fc, state.clim, clim_store=store)
+        feat = extract_forecast_features.extract_features(anoms, state.clim, clim_store=store)
+        t1 = time.perf_counter()
+        timings["features"] = t1 - t
+        out = predict.predict_features(feat, state.bundle, state.thresholds)
+        timings["predict"] = time.perf_counter() - t1
+        return out
+
+    def handle(self, req: dict) -> dict:
+        timings = {}
+        t = time.perf_counter()
+        fc = self.fetch(req)
+        timings["fetch"] = time.perf_counter() - t
+        out = self.score(fc, timings)
+        out["valid_date"] = out["valid_date"].dt.strftime("%Y-%m-%d")
+        return {"rows": json.loads(out.to_json(orient="records")),
+                "timings_s": {k: round(v, 4) for k, v in timings.items()}}
+
+
+class Metrics:
+    def __init__(self, window: int = 1000):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.counts = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.latency = defaultdict(lambda: deque(maxlen=window))
+
+    def record(self, endpoint: str, seconds: float, ok: bool) -> None:
+        with self.lock:
+            self.counts[endpoint] += 1
+            if not ok:
+                self.errors[endpoint] += 1
+            self.latency[endpoint].append(seconds)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            out = {"uptime_s": round(time.time() - self.started, 1), "endpoints": {}}
+            for ep, n in self.counts.items():
+                lat = np.asarray(self.latency[ep]) * 1000.0
+                out["endpoints"][ep] = {
+                    "requests": n,
+                    "errors": self.errors[ep],
+                    "latency_ms": {
+                        "mean": round(float(lat.mean()), 2),
+                        "p50": round(float(np.percentile(lat, 50)), 2),
+                        "p95": round(float(np.percentile(lat, 95)), 2),
+                        "max": round(float(lat.max()), 2),
+                    },
+                }
+            return out
+
+
+def make_handler(predictor: Predictor, metrics: Metrics):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code: int, body: dict) -> None:
+            data = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _dispatch(self, routes: dict) -> None:
+            t = time.perf_counter()
+            fn = routes.get(self.path)
+            if fn is None:
+                self._send(404, {"error": f"unknown endpoint {self.path}"})
+                return
+            ok = True
+            try:
+                code, body = fn()
+            except (KeyError, ValueError, FileNotFoundError, RuntimeError) as e:
+                ok, code, body = False, 400, {"error": f"{type(e).__name__}: {e}"}
+            except Exception as e:
+                ok, code, body = False, 500, {"error": f"{type(e).__name__}: {e}"}
+            metrics.record(self.path, time.perf_counter() - t, ok)
+            self._send(code, body)
+
+        def _json_body(self) -> dict:
+            n = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(n) or b"{}")
+
+        def do_GET(self):
+            self._dispatch({
+                "/health": lambda: (200, {"status": "ok"}),
+                "/metrics": lambda: (200, metrics.snapshot()),
+            })
+
+        def do_POST(self):
+            def reload():
+                predictor.reload()
+                return 200, {"status": "reloaded"}
+
+            self._dispatch({
+                "/predict": lambda: (200, predictor.handle(self._json_body())),
+                "/reload": reload,
+            })
+
+        def log_message(self, fmt, *args):
+            print(f"{self.address_string()} {fmt % args}")
+
+    return Handler
+
+
+def main():
+    args = parse_args()
+    t = time.perf_counter()
+    predictor = Predictor(args.clim_nc, args.clim_store, workers=args.workers, data_dir=args.data_dir)
+    print(f"Loaded model and climatology in {time.perf_counter() - t:.2f}s")
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(predictor, Metrics()))
+    print(f"Serving on http://{args.host}:{args.port} (POST /predict, GET /metrics)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+# src/storage.py
+"""
+Typed, compressed Parquet storage for the tabular intermediates
+(era5_features, prices, model_table, forecast_features, backtest_oos,
+gfs_backfill).
+
+write_table() validates a frame against its schema, casts dtypes and writes
+Parquet (optionally hive-partitioned by year of the date column).
+read_table() loads only the requested columns and date range. Paths ending
+in .csv are still read/written as CSV so older artifacts keep working.
+"""
+from __future__ import annotations
+
+import os
+import shutil
+from pathlib import Path
+
+import pandas as pd
+
+from features import FEATURE_COLS
+
+COMPRESSION = "zstd"
+
+# Required columns and their dtypes per table; extra columns are kept as-is.
+SCHEMAS: dict[str, dict[str, str]] = {
+    "era5_features": {"date": "datetime64[ns]", **{c: "float64" for c in FEATURE_COLS}},
+    "prices": {"date": "datetime64[ns]", "close": "float64", "ret": "float64",
+               "target_next_absret": "float64"},
+    "model_table": {"date": "datetime64[ns]", **{c: "float64" for c in FEATURE_COLS},
+                    "target_next_absret": "float64"},
+    "forecast_features": {**{c: "float64" for c in FEATURE_COLS},
+                          "valid_date": "datetime64[ns]", "doy": "int64", "lead_h": "int64"},
+    "backtest_oos": {"date": "datetime64[ns]", "y_true": "float64", "y_pred": "float64", "fold": "int64",
+                     "train_start": "datetime64[ns]", "train_end": "datetime64[ns]"},
+    "gfs_backfill": {"init_time": "datetime64[ns]", "lead_h": "int64", "valid_date": "datetime64[ns]",
+                     "doy": "int64", **{c: "float64" for c in FEATURE_COLS}},
+}
+
+# Date column used for partitioning and range filters
+DATE_COLS = {"era5_features": "date", "prices": "date", "model_table": "date",
+             "forecast_features": "valid_date", "backtest_oos": "date", "gfs_backfill": "init_time"}
+
+# Tables partitioned by year when written as Parquet
+PARTITIONED = {"era5_features", "model_table", "gfs_backfill"}
+
+
+def validate(df: pd.DataFrame, name: str) -> pd.DataFrame:
+    """Check required columns exist and cast them to the schema dtypes."""
+    schema = SCHEMAS[name]
+    missing = [c for c in schema if c not in df.columns]
+    if missing:
+        raise ValueError(f"{name}: missing columns {missing}. Found: {list(df.columns)}")
+    try:
+        return df.astype(schema)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"{name}: columns do not match schema {schema}: {e}") from e
+
+
+def write_table(df: pd.DataFrame, path, name: str, partition: bool | None = None) -> Path:
+    """Validate and write df; partition defaults to whether the table is in PARTITIONED."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    df = validate(df, name)
+
+    if path.suffix == ".csv":
+        df.to_csv(path, index=False)
+        return path
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    date_col = DATE_COLS[name]
+
+    # Write next to the target, then swap in: readers never see a partially written table
+    tmp = path.with_name(path.name + ".tmp")
+    _remove(tmp)
+    if partition is None:
+        partition = name in PARTITIONED
+    if partition:
+        table = table.append_column("year", pa.array(df[date_col].dt.year.to_numpy()))
+        pq.write_to_dataset(table, tmp, partition_cols=["year"], compression=COMPRESSION)
+    else:
+        pq.write_table(table, tmp, compression=COMPRESSION)
+
+    if not partition and not path.is_dir():
+        # Atomic: readers see either the old file or the new one
+        os.replace(tmp, path)
+        return path
+
+    # A directory cannot be replaced atomically. The old table is renamed aside
+    # first, so for a moment there is no table at path; a crash in that gap
+    # leaves the old table at <path>.old and the new one at <path>.tmp.
+    old = path.with_name(path.name + ".old")
+    _remove(old)
+    if path.exists():
+        path.rename(old)
+    tmp.rename(path)
+    _remove(old)
+    return path
+
+
+def _remove(path: Path) -> None:
+    if path.is_dir():
+        shutil.rmtree(path)
+    else:
+        path.unlink(missing_ok=True)
+
+
+def read_table(path, name: str, columns: list[str] | None = None,
+               start=None, end=None) -> pd.DataFrame:
+    """
+    Load a table, optionally only some columns and dates in [start, end].
+    Only the date column is added to columns when a date range is requested.
+    """
+    path = Path(path)
+    date_col = DATE_COLS[name]
+
+    if path.suffix == ".csv":
+        usecols = columns
+        if columns is not None and (start is not None or end is not None):
+            usecols = list(dict.fromkeys([date_col, *columns]))
+        df = pd.read_csv(path, usecols=usecols)
+        if date_col in df.columns:
+            df[date_col] = pd.to_datetime(df[date_col])
+        if start is not None:
+            df = df[df[date_col] >= pd.Timestamp(start)]
+        if end is not None:
+            df = df[df[date_col] <= pd.Timestamp(end)]
+        return df.reset_index(drop=True)
+
+    import pyarrow.parquet as pq
+
+    filters = []
+    if start is not None:
+        filters.append((date_col, ">=", pd.Timestamp(start)))
+        if path.is_dir():
+            filters.append(("year", ">=", pd.Timestamp(start).year))
+    if end is not None:
+        filters.append((date_col, "<=", pd.Timestamp(end)))
+        if path.is_dir():
+            filters.append(("year", "<=", pd.Timestamp(end).year))
+
+    cols = columns
+    if cols is None and path.is_dir():
+        cols = [c for c in pq.ParquetDataset(path).schema.names if c != "year"]
+    if cols is not None and filters and date_col not in cols:
+        cols = [date_col] + list(cols)
+
+    df = pq.read_table(path, columns=cols, filters=filters or None).to_pandas()
+    if date_col in df.columns:
+        df = df.sort_values(date_col, kind="stable")
+    return df.reset_index(drop=True)
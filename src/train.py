@@ -1,11 +1,16 @@
+import argparse
+
 import joblib
+import numpy as np
 import pandas as pd
-from sklearn.model_selection import TimeSeriesSplit
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
 from sklearn.linear_model import Ridge
-from sklearn.metrics import mean_absolute_error
-from config import PROCESSED_DIR, MODELS_DIR
+from config import PROCESSED_DIR, MODELS_DIR, ensure_parent
+from predict import REGIME_QUANTILES
+from ridge_stats import RidgeStats, to_pipeline
+from storage import read_table
+from walkforward import fold_mae, fold_splits, run_splits, run_splits_path, run_splits_stats
 
 
 FEATURE_COLS = [
@@ -24,46 +29,107 @@ FEATURE_COLS = [
 
 TARGET_COL = "target_next_absret"
 
+# Percentile grid kept in the bundle for arbitrary quantile lookups (see predict.target_quantile)
+SKETCH_PROBS = np.linspace(0.0, 1.0, 101)
+
+
+def target_thresholds(y: pd.Series) -> dict:
+    """Regime thresholds (p50/p75/p90/p95) of the historical target."""
+    return {q: float(y.quantile(int(q[1:]) / 100)) for q in REGIME_QUANTILES}
+
+
+def target_sketch(y: pd.Series) -> dict:
+    return {"probs": SKETCH_PROBS, "values": np.quantile(y.to_numpy(dtype=float), SKETCH_PROBS)}
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Fit the StandardScaler + Ridge model and save the bundle.")
+    p.add_argument("--alpha", type=float, default=1.0)
+    p.add_argument("--n_splits", type=int, default=5, help="Expanding time-series CV folds.")
+    p.add_argument("--engine", choices=["stats", "sklearn"], default="stats",
+                   help="stats: every fold and the final fit from one set of prefix sums (ridge_stats.py); "
+                        "sklearn: refit the Pipeline per fold.")
+    p.add_argument("--select_alpha", action="store_true",
+                   help="Pick alpha by CV MAE over --alpha_grid (one eigendecomposition per fold).")
+    p.add_argument("--alpha_grid", type=float, nargs=3, metavar=("LOG10_MIN", "LOG10_MAX", "N"),
+                   default=(-3.0, 4.0, 29), help="Log-spaced alpha grid for --select_alpha.")
+    return p.parse_args()
+
+
+def select_alpha(X: np.ndarray, y: np.ndarray, splits, alphas: np.ndarray, stats: RidgeStats) -> dict:
+    """CV MAE curve over alphas (all folds and alphas from one batched eigendecomposition)."""
+    pred, fold = run_splits_path(X, y, splits, alphas, stats=stats)
+    by_fold = np.stack([fold_mae(y, pred[:, j], fold, len(splits)) for j in range(len(alphas))], axis=1)
+    mean = by_fold.mean(axis=0)
+    return {
+        "alphas": alphas,
+        "cv_mae": mean,
+        "cv_mae_by_fold": by_fold,
+        "alpha": float(alphas[int(np.argmin(mean))]),
+    }
+
 
 def main():
+    args = parse_args()
+    if args.select_alpha and args.engine != "stats":
+        raise SystemExit("--select_alpha uses the sufficient-statistics engine (--engine stats).")
+
     # Load model table
-    df = pd.read_csv(PROCESSED_DIR / "model_table.csv", parse_dates=["date"])
+    df = read_table(PROCESSED_DIR / "model_table.parquet", "model_table",
+                    columns=["date"] + FEATURE_COLS + [TARGET_COL])
+
+    # Historical target distribution for regime labels (every row with a target)
+    y_hist = df[TARGET_COL].dropna()
+    thresholds = target_thresholds(y_hist)
 
     # Drop rows with missing target/features
     df = df.dropna(subset=FEATURE_COLS + [TARGET_COL]).sort_values("date")
 
     X = df[FEATURE_COLS]
     y = df[TARGET_COL]
+    Xa, ya = X.to_numpy(dtype=float), y.to_numpy(dtype=float)
 
-    model = Pipeline([
-        ("scaler", StandardScaler()),
-        ("reg", Ridge(alpha=1.0))
-    ])
-
-    # Time-series CV
-    tscv = TimeSeriesSplit(n_splits=5)
-    maes = []
-    for train_idx, val_idx in tscv.split(X):
-        X_train, X_val = X.iloc[train_idx], X.iloc[val_idx]
-        y_train, y_val = y.iloc[train_idx], y.iloc[val_idx]
-
-        model.fit(X_train, y_train)
-        preds = model.predict(X_val)
-        maes.append(mean_absolute_error(y_val, preds))
+    # Time-series CV (same folds as TimeSeriesSplit)
+    splits = fold_splits(len(df), args.n_splits)
+    alpha, cv = args.alpha, None
+    if args.engine == "stats":
+        stats = RidgeStats(Xa, ya)
+        if args.select_alpha:
+            lo, hi, n = args.alpha_grid
+            cv = select_alpha(Xa, ya, splits, np.logspace(lo, hi, int(n)), stats)
+            alpha = cv["alpha"]
+            print(f"Selected alpha={alpha:.4g} from {len(cv['alphas'])} candidates")
+        pred, fold = run_splits_stats(Xa, ya, splits, alpha, stats=stats)
+    else:
+        model = Pipeline([
+            ("scaler", StandardScaler()),
+            ("reg", Ridge(alpha=alpha))
+        ])
+        pred, fold = run_splits(model, Xa, ya, splits)
+    maes = fold_mae(ya, pred, fold, len(splits))
 
-    print(f"CV MAE (mean): {sum(maes)/len(maes):.6f}")
+    print(f"CV MAE (mean): {maes.mean():.6f}")
 
     # Fit on all data and save
-    model.fit(X, y)
-    out_path = MODELS_DIR / "model.joblib"
+    if args.engine == "stats":
+        model = to_pipeline(stats.fit(0, len(df), alpha), FEATURE_COLS, alpha)
+    else:
+        model.fit(X, y)
+    out_path = ensure_parent(MODELS_DIR / "model.joblib")
     joblib.dump(
         {
             "model": model,
             "feature_cols": FEATURE_COLS,
             "target_col": TARGET_COL,
+            "thresholds": thresholds,
+            "target_sketch": target_sketch(y_hist),
+            "alpha": alpha,
+            "cv_mae": float(maes.mean()),
+            "alpha_cv": cv,
         },
         out_path
     )
+    print("Target thresholds: " + ", ".join(f"{q}={v:.5f}" for q, v in thresholds.items()))
     print(f"Saved model bundle: {out_path}")
 
 
@@ -0,0 +1,163 @@
+# src/walkforward.py
+"""
+Walk-forward backtest engine.
+
+Rows are sorted by date and every split is a pair of contiguous row ranges:
+  - "folds": TimeSeriesSplit-style expanding folds (the original backtest)
+  - "walk":  refit at the first row of every day/week/month, train on an
+             expanding or rolling window of earlier rows, and predict until
+             the next refit.
+Splits are fitted in a process pool in batches (the data is sent once per
+worker) and predictions are written back by slice. For the standard
+StandardScaler + Ridge model, run_splits_stats() instead solves every split
+at once from prefix sums (ridge_stats.py), which makes daily refits cheap.
+"""
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+
+from ridge_stats import RidgeStats, predict_path, predict_rows
+
+REFIT_FREQ = {"daily": "D", "weekly": "W", "monthly": "M"}
+
+
+class Split(NamedTuple):
+    train_start: int
+    train_end: int
+    test_start: int
+    test_end: int
+
+
+def fold_splits(n: int, n_splits: int = 5) -> list[Split]:
+    """Same train/test rows as sklearn's TimeSeriesSplit(n_splits)."""
+    test_size = n // (n_splits + 1)
+    first = n - n_splits * test_size
+    return [Split(0, first + k * test_size, first + k * test_size, first + (k + 1) * test_size)
+            for k in range(n_splits)]
+
+
+def walk_splits(dates, refit: str = "monthly", window: str = "expanding",
+                window_rows: int | None = None, min_train: int = 252) -> list[Split]:
+    """One split per refit period; training always ends at the refit row."""
+    dates = pd.DatetimeIndex(dates)
+    if refit not in REFIT_FREQ:
+        raise ValueError(f"refit must be one of {list(REFIT_FREQ)}, got '{refit}'")
+    if window == "rolling" and not window_rows:
+        raise ValueError("A rolling window needs window_rows.")
+
+    period = dates.to_period(REFIT_FREQ[refit]).asi8
+    starts = np.flatnonzero(np.r_[True, period[1:] != period[:-1]])
+    starts = starts[starts >= max(min_train, 1)]
+    ends = np.r_[starts[1:], len(dates)]
+    if window == "rolling":
+        train_starts = np.maximum(0, starts - window_rows)
+    else:
+        train_starts = np.zeros_like(starts)
+    return [Split(int(a), int(b), int(b), int(c)) for a, b, c in zip(train_starts, starts, ends)]
+
+
+# Per-worker state, set once by the pool initializer
+_STATE: dict = {}
+
+
+def _init_worker(model, X: np.ndarray, y: np.ndarray) -> None:
+    _STATE.update(model=model, X=X, y=y)
+
+
+def _fit_batch(batch: list[tuple[int, Split]]) -> list[tuple[int, np.ndarray]]:
+    model, X, y = _STATE["model"], _STATE["X"], _STATE["y"]
+    out = []
+    for k, s in batch:
+        m = clone(model).fit(X[s.train_start:s.train_end], y[s.train_start:s.train_end])
+        out.append((k, m.predict(X[s.test_start:s.test_end])))
+    return out
+
+
+def run_splits(model, X: np.ndarray, y: np.ndarray, splits: list[Split],
+               workers: int = 1) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Out-of-sample prediction for every test row (NaN where no split covers it)
+    and the index of the split that produced it (-1 if none).
+    """
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    jobs = list(enumerate(splits))
+
+    if workers <= 1 or len(jobs) < 2:
+        _init_worker(model, X, y)
+        results = _fit_batch(jobs)
+    else:
+        batches = [b for b in np.array_split(np.arange(len(jobs)), workers * 4) if len(b)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(model, X, y)) as pool:
+            parts = pool.map(_fit_batch, [[jobs[i] for i in b] for b in batches])
+            results = [r for part in parts for r in part]
+
+    pred = np.full(len(y), np.nan)
+    fold = np.full(len(y), -1, dtype=np.int64)
+    for k, p in results:
+        s = splits[k]
+        pred[s.test_start:s.test_end] = p
+        fold[s.test_start:s.test_end] = k
+    return pred, fold
+
+
+def run_splits_stats(X: np.ndarray, y: np.ndarray, splits: list[Split], alpha: float,
+                     stats: RidgeStats | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """run_splits() for Pipeline([StandardScaler, Ridge(alpha)]): one batched solve for all splits."""
+    X = np.asarray(X, dtype=np.float64)
+    stats = stats if stats is not None else RidgeStats(X, y)
+    fits = stats.fit([s.train_start for s in splits], [s.train_end for s in splits], alpha)
+
+    fold = np.full(len(X), -1, dtype=np.int64)
+    for k, s in enumerate(splits):
+        fold[s.test_start:s.test_end] = k
+    pred = np.full(len(X), np.nan)
+    rows = np.flatnonzero(fold >= 0)
+    pred[rows] = predict_rows(fits, X[rows], fold[rows])
+    return pred, fold
+
+
+def run_splits_path(X: np.ndarray, y: np.ndarray, splits: list[Split], alphas,
+                    stats: RidgeStats | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """run_splits_stats() for a whole alpha grid: predictions are (n_rows, n_alphas)."""
+    X = np.asarray(X, dtype=np.float64)
+    stats = stats if stats is not None else RidgeStats(X, y)
+    path = stats.fit_path([s.train_start for s in splits], [s.train_end for s in splits])
+
+    fold = np.full(len(X), -1, dtype=np.int64)
+    for k, s in enumerate(splits):
+        fold[s.test_start:s.test_end] = k
+    pred = np.full((len(X), len(alphas)), np.nan)
+    rows = np.flatnonzero(fold >= 0)
+    pred[rows] = predict_path(path, X[rows], fold[rows], alphas)
+    return pred, fold
+
+
+def fold_mae(y: np.ndarray, pred: np.ndarray, fold: np.ndarray, n_folds: int) -> np.ndarray:
+    """Mean absolute error of the out-of-sample rows of each split."""
+    ok = fold >= 0
+    err = np.bincount(fold[ok], weights=np.abs(y[ok] - pred[ok]), minlength=n_folds)
+    return err / np.maximum(np.bincount(fold[ok], minlength=n_folds), 1)
+
+
+def oos_frame(dates, y: np.ndarray, pred: np.ndarray, fold: np.ndarray, splits: list[Split]) -> pd.DataFrame:
+    """Out-of-sample rows with the split and the training window they came from."""
+    dates = pd.DatetimeIndex(dates)
+    ok = fold >= 0
+    k = fold[ok]
+    train_start = np.array([s.train_start for s in splits], dtype=np.int64)[k]
+    train_end = np.array([s.train_end for s in splits], dtype=np.int64)[k]
+    return pd.DataFrame({
+        "date": dates[ok],
+        "y_true": y[ok],
+        "y_pred": pred[ok],
+        "fold": k,
+        "train_start": dates[train_start],
+        "train_end": dates[train_end - 1],
+    })